@@ -4,6 +4,7 @@ import numpy as np
 
 from .. import metrics
 from .. import utils
+from .. import distances
 from .GAN import GAN
 
 #                   Adversarial Autoencoder
@@ -15,29 +16,42 @@ from .GAN import GAN
 #   useful latent representation of data. 
 
 class AAE(GAN):
-    def __init__(self, sess, input_shape, latent_dim = 100, **kwargs):
+    in_graph_inputs = False
+    
+    def __init__(self, sess, input_shape, latent_dim = 100, merge_updates = False, **kwargs):
         super(AAE, self).__init__(sess, input_shape, latent_dim , **kwargs)
         
+        # Discriminator takes latent codes, image augmentation does not apply to them
+        if self.augmentation is not None: raise Exception('AAE does not support augmentation, its discriminator inputs are latent codes')
+        
+        # If True, adversarial and reconstruction updates of encoder are made in one run
+        self.merge_updates = merge_updates
+        
     def set_models_params(self):
         if self.optimizer is None: self.optimizer = tf.train.AdamOptimizer(0.0002, 0.5, epsilon = 1e-07)
         if self.distance is None: self.distance = distances.minmax
             
         self.models = ['encoder', 'decoder', 'discriminator']
+        self.generator_scopes = ['ENC', 'DEC']
+        self.ema_scopes = ['DEC'] # only decoder is smoothed (see build_smooth_graph)
 
     def build_graph(self):
         
+        @self.recompute_grad
         def ENC(x):
-            with tf.variable_scope('ENC', reuse=tf.AUTO_REUSE) as scope:
+            with self.model_scope('ENC') as scope:
                 res = self.encoder(x)
             return res
             
+        @self.recompute_grad
         def DEC(x):
-            with tf.variable_scope('DEC', reuse=tf.AUTO_REUSE) as scope:
+            with self.model_scope('DEC') as scope:
                 res = self.decoder(x)
             return res
             
+        @self.recompute_grad
         def D(x):
-            with tf.variable_scope('D', reuse=tf.AUTO_REUSE) as scope:
+            with self.model_scope('D') as scope:
                 logits = self.discriminator(x)
             return logits
         
@@ -45,14 +59,15 @@ class AAE(GAN):
         self.dec_input = tf.placeholder(tf.float32, shape=(None, self.latent_dim))
         self.disc_input = tf.placeholder(tf.float32, shape=(None, self.latent_dim))
         
-        self.autoencode_loss = tf.reduce_mean(tf.squared_difference(self.enc_input, DEC(ENC(self.enc_input))))
-        self.autoencode_vars = tf.trainable_variables('ENC') + tf.trainable_variables('DEC')
+        genr = ENC(self.enc_input)
+        
+        self.autoencode_loss = tf.reduce_mean(tf.squared_difference(self.enc_input, DEC(genr)))
+        self.autoencode_vars = self.trainable_variables('ENC') + self.trainable_variables('DEC')
         self.autoencode_train = self.optimizer.minimize(self.autoencode_loss, var_list=self.autoencode_vars)
         
         self.dec = DEC(self.dec_input)
 
         # Domain a GAN
-        genr = ENC(self.enc_input)
         logit_real = D(self.disc_input)
         logit_fake = D(genr)
         
@@ -65,19 +80,42 @@ class AAE(GAN):
             examples = [real, fake], 
             models = [ENC, D],
             inputs = [self.enc_input, self.disc_input],
-            vars = [tf.trainable_variables('ENC'), tf.trainable_variables('D')],
+            vars = [self.trainable_variables('ENC'), self.trainable_variables('D')],
             gan = self
             )
             
         self.train_genr, self.train_disc = dist_a.get_train_sessions() 
         self.genr_loss, self.disc_loss = dist_a.get_losses()
-                
-        self.sess.run(tf.global_variables_initializer())
+        
+        if self.merge_updates:
+            merged_loss = self.genr_loss + self.autoencode_loss
+            self.train_genr_autoencode = self.optimizer.minimize(merged_loss, var_list=self.autoencode_vars)
+     
+    def build_smooth_graph(self, custom_getter):
+        with self.model_scope('DEC', custom_getter = custom_getter):
+            self.smooth_dec = self.decoder(self.dec_input)
      
-    def predict(self, noise):  
-        imgs = self.sess.run(self.dec, feed_dict = {self.dec_input: noise})
+    def build_callables(self):
+        feeds = [self.disc_input, self.enc_input]
+        self.call_train_disc = self.make_callable(self.train_disc, feeds)
+        self.call_train_genr = self.make_callable(self.train_genr, feeds)
+        self.call_losses = self.make_callable([self.disc_loss, self.genr_loss], feeds)
+        if self.merge_updates: self.call_train_genr_autoencode = self.make_genr_callable([self.train_genr_autoencode, self.disc_loss, self.genr_loss, self.autoencode_loss], feeds, [self.train_genr_autoencode])
+        
+        # Autoencoder step is the last update of generator weights, moving averages are updated with it
+        self.call_autoencode_train = self.make_genr_callable(self.autoencode_train, [self.enc_input], [self.autoencode_train])
+        self.call_autoencode_loss = self.make_callable(self.autoencode_loss, [self.enc_input])
+        
+        self.call_dec = self.make_callable(self.dec, [self.dec_input])
+        self.call_smooth_dec = self.make_callable(self.smooth_dec, [self.dec_input])
+     
+    def predict(self, noise, moving_avarage = False):  
+        imgs = (self.call_smooth_dec if moving_avarage else self.call_dec)(noise)
         return imgs 
      
+    def export_signature(self, moving_avarage = False):
+        return [self.dec_input], self.smooth_dec if moving_avarage else self.dec
+        
     def train_on_batch(self, batch_size):
         for j in range(self.n_critic):
             # Select a random batch of images
@@ -86,16 +124,21 @@ class AAE(GAN):
         
             # Sample noise as generator input
             noise = np.random.uniform(-1, 1, (batch_size, self.latent_dim))
-            self.sess.run(self.train_disc, feed_dict={self.disc_input: noise, self.enc_input: imgs})
+            self.call_train_disc(noise, imgs)
                         
         noise = np.random.uniform(-1, 1, (batch_size, self.latent_dim))
-        self.sess.run([self.train_genr], feed_dict={self.disc_input: noise, self.enc_input: imgs})
         
-        d_loss, g_loss = self.sess.run([self.disc_loss, self.genr_loss], feed_dict={self.disc_input: noise, self.enc_input: imgs})
+        if self.merge_updates:
+            _, d_loss, g_loss, self.m_loss = self.call_train_genr_autoencode(noise, imgs)
+            return d_loss, g_loss
+            
+        self.call_train_genr(noise, imgs)
+        
+        d_loss, g_loss = self.call_losses(noise, imgs)
         
         # train Autoencoder
-        self.sess.run(self.autoencode_train, feed_dict={self.enc_input: imgs}) 
-        self.m_loss = self.sess.run(self.autoencode_loss, feed_dict={self.enc_input: imgs})
+        self.call_autoencode_train(imgs)
+        self.m_loss = self.call_autoencode_loss(imgs)
         
         return d_loss, g_loss
         
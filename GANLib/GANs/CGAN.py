@@ -4,6 +4,7 @@ import numpy as np
 
 from .. import metrics
 from .. import utils
+from .. import distances
 from .GAN import GAN
 
 #                   Conditional Generative Adversarial Network
@@ -14,6 +15,8 @@ from .GAN import GAN
 #   similar to original dataset specified by some given labels.
 
 class CGAN(GAN):
+    in_graph_inputs = False
+    
     def metric_test(self, set_data, set_labels, pred_num = 32):    
         met_arr = np.zeros(pred_num)
         
@@ -26,56 +29,73 @@ class CGAN(GAN):
         met_arr = metrics.magic_distance(org_set, gen_set)
         return met_arr
 
-    def __init__(self, sess, input_shapes, latent_dim = 100, **kwargs):
+    def __init__(self, sess, input_shapes, latent_dim = 100, sparse_labels = False, sampling = None, **kwargs):
         super(CGAN, self).__init__(sess, input_shapes[0], latent_dim , **kwargs)
         self.label_shape = input_shapes[1]
         
+        # If True, labels are fed as integer class indices and one-hot encoded in graph, 
+        # label_shape should be (number of classes,) in that case
+        self.sparse_labels = sparse_labels
+        
+        # Class sampling of training batches: None (uniform over samples), 'balanced' (uniform over classes), 
+        # 'stratified' (proportional to class frequencies) or array of per-class weights
+        self.sampling = sampling
+        
     def set_models_params(self):
         if self.optimizer is None: self.optimizer = tf.train.AdamOptimizer(0.001, 0.5, epsilon = 1e-07)
         if self.distance is None: self.distance = distances.minmax
             
         self.models = ['generator', 'discriminator']
+        self.generator_scopes = ['G']
+        self.ema_scopes = ['G']
 
     def build_graph(self):
         
+        @self.recompute_grad
         def G(x, l):
-            with tf.variable_scope('G', reuse=tf.AUTO_REUSE) as scope:
+            with self.model_scope('G') as scope:
                 res = self.generator(x, l)
             return res
             
+        @self.recompute_grad
         def D(x, l):
-            with tf.variable_scope('D', reuse=tf.AUTO_REUSE) as scope:
+            with self.model_scope('D') as scope:
                 logits = self.discriminator(x, l)
             return logits
         
         self.genr_input = tf.placeholder(tf.float32, shape=(None, self.latent_dim))
-        self.genr_label = tf.placeholder(tf.float32, shape=(None,) + self.label_shape)
-        
         self.disc_input = tf.placeholder(tf.float32, shape=(None,) + self.input_shape)
-        self.disc_label = tf.placeholder(tf.float32, shape=(None,) + self.label_shape)
+        
+        if self.sparse_labels:
+            # One label tensor shared by generator and discriminator
+            self.label_input = tf.placeholder(tf.int32, shape=(None,))
+            self.genr_label = self.disc_label = tf.one_hot(self.label_input, self.label_shape[-1])
+        else:
+            self.genr_label = tf.placeholder(tf.float32, shape=(None,) + self.label_shape)
+            self.disc_label = tf.placeholder(tf.float32, shape=(None,) + self.label_shape)
         
         
         self.genr = G(self.genr_input, self.genr_label)
-        logit_real = D(self.disc_input, self.disc_label)
-        logit_fake = D(self.genr, self.genr_label)
+        real, fake, G_fake = self.augment_examples(self.disc_input, self.genr, G)
         
-        real = self.disc_input
-        fake = self.genr
+        logit_real = D(real, self.disc_label)
+        logit_fake = D(fake, self.genr_label)
         
         dist = self.distance(
             optimizer = self.optimizer, 
             logits = [logit_real, logit_fake], 
             examples = [real, fake], 
-            models = [G, D],
+            models = [G_fake, D],
             inputs = [self.genr_input, self.disc_input],
-            vars = [tf.trainable_variables('G'), tf.trainable_variables('D')],
+            vars = [self.trainable_variables('G'), self.trainable_variables('D')],
             gan = self
             )
             
         self.train_genr, self.train_disc = dist.get_train_sessions() 
         self.genr_loss, self.disc_loss = dist.get_losses()
         
-        self.sess.run(tf.global_variables_initializer())
+        if self.simultaneous:
+            self.train_both = dist.get_simultaneous_session()
      
     def prepare_data(self, data_set, validation_split, batch_size):
         if 0. < validation_split < 1.:
@@ -90,26 +110,123 @@ class CGAN(GAN):
             self.train_set_labels = data_set[1]
             self.valid_set_data = None
             self.valid_set_labels = None
+            
+        if self.sampling is not None:
+            self.build_class_tables()
+            
+    def build_class_tables(self):
+        labels = self.train_set_labels
+        if self.sparse_labels: classes = np.reshape(labels, (-1,)).astype(np.int64)
+        else: classes = np.argmax(np.reshape(labels, (labels.shape[0], -1)), axis = -1)
+        
+        # Indices of samples sorted by class, so each class is a contiguous range of the table
+        self.class_order = np.argsort(classes, kind = 'mergesort')
+        self.class_count = np.bincount(classes, minlength = self.label_shape[-1])
+        self.class_start = np.cumsum(self.class_count) - self.class_count
+        
+        present = (self.class_count > 0).astype(np.float64)
+        if isinstance(self.sampling, str):
+            if   self.sampling == 'balanced':   weights = present
+            elif self.sampling == 'stratified': weights = self.class_count.astype(np.float64)
+            else: raise Exception("Unknown sampling '%s'!"%(self.sampling))
+        else:
+            weights = np.asarray(self.sampling, dtype = np.float64) * present
+            
+        self.class_p = weights / np.sum(weights)
+            
+    def sample_indices(self, batch_size):
+        if self.sampling is None:
+            return np.random.randint(0, self.train_set_data.shape[0], batch_size)
+        
+        # Every class gets the whole part of its share of the batch, the remainder is drawn with
+        # fractional parts of shares, so class frequencies stay exactly proportional to class_p
+        share = self.class_p * batch_size
+        quota = np.floor(share).astype(np.int64)
+        leftover = share - quota
+        n_rest = batch_size - np.sum(quota)
+        rest = np.random.choice(len(quota), n_rest, p = leftover / np.sum(leftover)) if n_rest > 0 else np.zeros(0, dtype = np.int64)
+        # Classes are shuffled, so layers that group consecutive samples (MiniBatchStddev) don't see single class groups
+        classes = np.random.permutation(np.concatenate((np.repeat(np.arange(len(quota)), quota), rest)))
+        
+        offsets = self.class_start[classes] + (np.random.random(batch_size) * self.class_count[classes]).astype(np.int64)
+        return self.class_order[offsets]
+     
+    # Label placeholders of training steps and values fed to them
+    def label_feeds(self):
+        if self.sparse_labels: return [self.label_input]
+        return [self.genr_label, self.disc_label]
+        
+    def label_values(self, labels):
+        if self.sparse_labels: return [np.reshape(labels, (-1,))]
+        return [labels, labels]
+        
+    def build_callables(self):
+        feeds = [self.disc_input, self.genr_input] + self.label_feeds()
+        self.call_train_disc = self.make_callable(self.train_disc, feeds)
+        self.call_train_genr = self.make_genr_callable(self.train_genr, feeds, [self.train_genr])
+        self.call_losses = self.make_callable([self.disc_loss, self.genr_loss], feeds)
+        if self.simultaneous: self.call_train_both = self.make_genr_callable([self.train_both, self.disc_loss, self.genr_loss], feeds, [self.train_both])
+        
+        feeds = [self.genr_input, self.label_input if self.sparse_labels else self.genr_label]
+        self.call_genr = self.make_callable(self.genr, feeds)
+        self.call_smooth_genr = self.make_callable(self.smooth_genr, feeds)
      
-    def predict(self, noise, labels):  
-        imgs = self.sess.run(self.genr, feed_dict = {self.genr_input: noise, self.genr_label: labels})
+    def build_smooth_graph(self, custom_getter):
+        with self.model_scope('G', custom_getter = custom_getter):
+            self.smooth_genr = self.generator(self.genr_input, self.genr_label)
+        
+    def predict(self, noise, labels, moving_avarage = False):  
+        if self.sparse_labels: labels = np.reshape(labels, (-1,))
+        imgs = (self.call_smooth_genr if moving_avarage else self.call_genr)(noise, labels)
         return imgs 
      
+    def export_signature(self, moving_avarage = False):
+        label_input = self.label_input if self.sparse_labels else self.genr_label
+        return [self.genr_input, label_input], self.smooth_genr if moving_avarage else self.genr
+        
+    # Streams samples for every given label into 'out' (see utils.write_chunks), next chunk is generated while current one is written
+    def generate(self, labels, batch_size = 1024, out = None, moving_avarage = False):
+        def predict_chunk(chunk):
+            start, stop = chunk
+            noise = np.random.uniform(-1, 1, (stop - start, self.latent_dim))
+            return self.predict(noise, labels[start:stop], moving_avarage)
+            
+        chunks = utils.prefetch(predict_chunk, utils.chunk_ranges(len(labels), batch_size))
+        return utils.write_chunks(chunks, out, len(labels))
+     
     def train_on_batch(self, batch_size):
+        if self.simultaneous:
+            return self.train_on_batch_simultaneous(batch_size)
+            
         for j in range(self.n_critic):
             # Select a random batch of images
-            idx = np.random.randint(0, self.train_set_data.shape[0], batch_size)
+            idx = self.sample_indices(batch_size)
             imgs = self.train_set_data  [idx]
             lbls = self.train_set_labels[idx]
         
             # Sample noise as generator input
             noise = np.random.uniform(-1, 1, (batch_size, self.latent_dim))
-            self.sess.run(self.train_disc, feed_dict={self.disc_input: imgs, self.disc_label: lbls, self.genr_label: lbls, self.genr_input: noise})
+            self.call_train_disc(imgs, noise, *self.label_values(lbls))
             
         noise = np.random.uniform(-1, 1, (batch_size, self.latent_dim))
-        self.sess.run([self.train_genr], feed_dict={self.disc_input: imgs, self.disc_label: lbls, self.genr_label: lbls, self.genr_input: noise})
+        self.call_train_genr(imgs, noise, *self.label_values(lbls))
         
-        d_loss, g_loss = self.sess.run([self.disc_loss, self.genr_loss], feed_dict={self.disc_input: imgs, self.disc_label: lbls, self.genr_label: lbls, self.genr_input: noise})
+        d_loss, g_loss = self.call_losses(imgs, noise, *self.label_values(lbls))
+        return d_loss, g_loss
+        
+    def train_on_batch_simultaneous(self, batch_size):
+        for j in range(self.n_critic - 1):
+            idx = self.sample_indices(batch_size)
+            imgs = self.train_set_data  [idx]
+            lbls = self.train_set_labels[idx]
+            noise = np.random.uniform(-1, 1, (batch_size, self.latent_dim))
+            self.call_train_disc(imgs, noise, *self.label_values(lbls))
+            
+        idx = self.sample_indices(batch_size)
+        imgs = self.train_set_data  [idx]
+        lbls = self.train_set_labels[idx]
+        noise = np.random.uniform(-1, 1, (batch_size, self.latent_dim))
+        _, d_loss, g_loss = self.call_train_both(imgs, noise, *self.label_values(lbls))
         return d_loss, g_loss
         
     def test_network(self, batch_size):
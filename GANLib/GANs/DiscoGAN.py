@@ -4,6 +4,7 @@ import numpy as np
 
 from .. import metrics
 from .. import utils
+from .. import distances
 from .GAN import GAN
 
 #                   DiscoGAN
@@ -15,36 +16,47 @@ from .GAN import GAN
 #   In limit it suppose to find one to one bijection mapping between this sets.
 
 class DiscoGAN(GAN):
-    def __init__(self, sess, input_shapes, latent_dim = 100, **kwargs):
+    in_graph_inputs = False
+    
+    def __init__(self, sess, input_shapes, latent_dim = 100, merge_updates = False, **kwargs):
         super(DiscoGAN, self).__init__(sess, input_shapes, latent_dim , **kwargs)
         self.input_shape_a = input_shapes[0]
         self.input_shape_b = input_shapes[1]
         
+        # If True, adversarial and cycle updates are made on the same batch in one run
+        self.merge_updates = merge_updates
+        
     def set_models_params(self):
         if self.optimizer is None: self.optimizer = tf.train.AdamOptimizer(0.0002, 0.5, epsilon = 1e-07)
         if self.distance is None: self.distance = distances.minmax
             
         self.models = ['encoder', 'decoder', 'discriminator_a', 'discriminator_b']
+        self.generator_scopes = ['ENC', 'DEC']
+        self.ema_scopes = ['ENC', 'DEC']
 
     def build_graph(self):
         
+        @self.recompute_grad
         def ENC(x):
-            with tf.variable_scope('ENC', reuse=tf.AUTO_REUSE) as scope:
+            with self.model_scope('ENC') as scope:
                 res = self.encoder(x)
             return res
             
+        @self.recompute_grad
         def DEC(x):
-            with tf.variable_scope('DEC', reuse=tf.AUTO_REUSE) as scope:
+            with self.model_scope('DEC') as scope:
                 res = self.decoder(x)
             return res
             
+        @self.recompute_grad
         def Da(x):
-            with tf.variable_scope('Da', reuse=tf.AUTO_REUSE) as scope:
+            with self.model_scope('Da') as scope:
                 logits = self.discriminator_a(x)
             return logits
             
+        @self.recompute_grad
         def Db(x):
-            with tf.variable_scope('Db', reuse=tf.AUTO_REUSE) as scope:
+            with self.model_scope('Db') as scope:
                 logits = self.discriminator_b(x)
             return logits
         
@@ -57,29 +69,28 @@ class DiscoGAN(GAN):
         self.t_encode_a = ENC(self.enc_input)
         self.t_encode_b = DEC(self.dec_input)
         
-        encoder_loss = tf.reduce_mean(tf.squared_difference(self.enc_input, DEC(ENC(self.enc_input))))
-        decoder_loss = tf.reduce_mean(tf.squared_difference(self.dec_input, ENC(DEC(self.dec_input))))
+        encoder_loss = tf.reduce_mean(tf.squared_difference(self.enc_input, DEC(self.t_encode_a)))
+        decoder_loss = tf.reduce_mean(tf.squared_difference(self.dec_input, ENC(self.t_encode_b)))
         
         self.autoencode_loss = 0.5 * (encoder_loss + decoder_loss)
-        self.autoencode_vars = tf.trainable_variables('ENC') + tf.trainable_variables('DEC')
+        self.autoencode_vars = self.trainable_variables('ENC') + self.trainable_variables('DEC')
         self.autoencode_train = self.optimizer.minimize(self.autoencode_loss, var_list=self.autoencode_vars)
         
 
         # Domain a GAN
-        genr = ENC(self.enc_input)
-        logit_real = Db(self.disc_b_input)
-        logit_fake = Db(genr)
+        genr = self.t_encode_a
+        real, fake, ENC_fake = self.augment_examples(self.disc_b_input, genr, ENC)
         
-        real = self.disc_b_input
-        fake = genr
+        logit_real = Db(real)
+        logit_fake = Db(fake)
         
         dist_a = self.distance(
             optimizer = self.optimizer, 
             logits = [logit_real, logit_fake], 
             examples = [real, fake], 
-            models = [ENC, Db],
+            models = [ENC_fake, Db],
             inputs = [self.enc_input, self.disc_b_input],
-            vars = [tf.trainable_variables('ENC'), tf.trainable_variables('Db')],
+            vars = [self.trainable_variables('ENC'), self.trainable_variables('Db')],
             gan = self
             )
             
@@ -88,20 +99,19 @@ class DiscoGAN(GAN):
         
         
         # Domain b GAN
-        genr = DEC(self.dec_input)
-        logit_real = Da(self.disc_a_input)
-        logit_fake = Da(genr)
+        genr = self.t_encode_b
+        real, fake, DEC_fake = self.augment_examples(self.disc_a_input, genr, DEC)
         
-        real = self.disc_a_input
-        fake = genr
+        logit_real = Da(real)
+        logit_fake = Da(fake)
         
         dist_b = self.distance(
             optimizer = self.optimizer, 
             logits = [logit_real, logit_fake], 
             examples = [real, fake], 
-            models = [DEC, Da],
+            models = [DEC_fake, Da],
             inputs = [self.dec_input, self.disc_a_input],
-            vars = [tf.trainable_variables('DEC'), tf.trainable_variables('Da')],
+            vars = [self.trainable_variables('DEC'), self.trainable_variables('Da')],
             gan = self
             )
             
@@ -111,28 +121,69 @@ class DiscoGAN(GAN):
         
         self.genr_loss, self.disc_loss = 0.5 * (self.genr_loss_a + self.genr_loss_b), 0.5 *(self.disc_loss_a + self.disc_loss_b) 
         
-        self.sess.run(tf.global_variables_initializer())
+        if self.merge_updates:
+            merged_loss = self.genr_loss_a + self.genr_loss_b + self.autoencode_loss
+            self.train_genr_cycle = self.optimizer.minimize(merged_loss, var_list=self.autoencode_vars)
     
     def prepare_data(self, data_set, validation_split, batch_size):
         self.domain_A_set = data_set[0]
         self.domain_B_set = data_set[1]
         
      
-    def encode_a(self, data_domain_a):  
-        imgs = self.sess.run(self.t_encode_a, feed_dict = {self.enc_input: data_domain_a})
+    def build_smooth_graph(self, custom_getter):
+        with self.model_scope('ENC', custom_getter = custom_getter):
+            self.smooth_encode_a = self.encoder(self.enc_input)
+        with self.model_scope('DEC', custom_getter = custom_getter):
+            self.smooth_encode_b = self.decoder(self.dec_input)
+     
+    def build_callables(self):
+        feeds = [self.disc_b_input, self.enc_input, self.disc_a_input, self.dec_input]
+        self.call_train_disc = self.make_callable([self.train_disc_a, self.train_disc_b], feeds)
+        self.call_train_genr = self.make_callable([self.train_genr_a, self.train_genr_b], feeds)
+        self.call_losses = self.make_callable([self.disc_loss, self.genr_loss], feeds)
+        if self.merge_updates: self.call_train_genr_cycle = self.make_genr_callable([self.train_genr_cycle, self.disc_loss, self.genr_loss, self.autoencode_loss], feeds, [self.train_genr_cycle])
+        
+        # Autoencoder step is the last update of generator weights, moving averages are updated with it
+        self.call_autoencode_train = self.make_genr_callable(self.autoencode_train, [self.enc_input, self.dec_input], [self.autoencode_train])
+        self.call_autoencode_loss = self.make_callable(self.autoencode_loss, [self.enc_input, self.dec_input])
+        
+        self.call_encode_a = self.make_callable(self.t_encode_a, [self.enc_input])
+        self.call_encode_b = self.make_callable(self.t_encode_b, [self.dec_input])
+        self.call_smooth_encode_a = self.make_callable(self.smooth_encode_a, [self.enc_input])
+        self.call_smooth_encode_b = self.make_callable(self.smooth_encode_b, [self.dec_input])
+     
+    def encode_a(self, data_domain_a, moving_avarage = False):  
+        imgs = (self.call_smooth_encode_a if moving_avarage else self.call_encode_a)(data_domain_a)
         return imgs 
         
-    def encode_b(self, data_domain_b):  
-        imgs = self.sess.run(self.t_encode_b, feed_dict = {self.dec_input: data_domain_b})
+    def encode_b(self, data_domain_b, moving_avarage = False):  
+        imgs = (self.call_smooth_encode_b if moving_avarage else self.call_encode_b)(data_domain_b)
         return imgs 
         
-    def decode_a(self, data_encoded_a):  
-        imgs = self.sess.run(self.t_encode_b, feed_dict = {self.enc_input: data_encoded_a})
-        return imgs 
+    def decode_a(self, data_encoded_a, moving_avarage = False):  
+        return self.encode_b(data_encoded_a, moving_avarage)
         
-    def decode_b(self, data_encoded_b):  
-        imgs = self.sess.run(self.t_encode_a, feed_dict = {self.dec_input: data_encoded_b})
-        return imgs 
+    def decode_b(self, data_encoded_b, moving_avarage = False):  
+        return self.encode_a(data_encoded_b, moving_avarage)
+        
+    # Translation of one of 'encode_a', 'encode_b', 'decode_a', 'decode_b' modes is exported
+    def export_signature(self, moving_avarage = False, mode = 'encode_a'):
+        if mode in ('encode_a', 'decode_b'): return [self.enc_input], self.smooth_encode_a if moving_avarage else self.t_encode_a
+        if mode in ('encode_b', 'decode_a'): return [self.dec_input], self.smooth_encode_b if moving_avarage else self.t_encode_b
+        raise Exception('Unknown translation mode: ' + str(mode))
+        
+    # Translates array, np.memmap or iterable of samples chunk by chunk with one of 'encode_a', 'encode_b', 'decode_a', 'decode_b',
+    # next chunk is translated while current one is consumed. Returns generator of translated chunks if 'out' is None, 
+    # otherwise writes them into 'out' (see utils.write_chunks)
+    def translate(self, data, mode = 'encode_a', batch_size = 256, out = None, moving_avarage = False):
+        def translate_chunk(chunk):
+            return getattr(self, mode)(chunk, moving_avarage)
+            
+        chunks = utils.prefetch(translate_chunk, utils.iterate_chunks(data, batch_size))
+        if out is None: return chunks
+        
+        n = len(data) if hasattr(data, '__len__') else None
+        return utils.write_chunks(chunks, out, n)
      
     def train_on_batch(self, batch_size):
         # ----------------------
@@ -146,14 +197,16 @@ class DiscoGAN(GAN):
             domain_A_samples = self.domain_A_set[idx_a]
             domain_B_samples = self.domain_B_set[idx_b]
         
-            feed_dict={self.disc_b_input: domain_B_samples, self.enc_input: domain_A_samples,
-                       self.disc_a_input: domain_A_samples, self.dec_input: domain_B_samples}
-                       
-            self.sess.run([self.train_disc_a, self.train_disc_b], feed_dict=feed_dict)
+            feeds = [domain_B_samples, domain_A_samples, domain_A_samples, domain_B_samples]
+            self.call_train_disc(*feeds)
+            
+        if self.merge_updates:
+            _, d_loss, g_loss, self.m_loss = self.call_train_genr_cycle(*feeds)
+            return d_loss, g_loss
             
-        self.sess.run([self.train_genr_a, self.train_genr_b], feed_dict=feed_dict)
+        self.call_train_genr(*feeds)
         
-        d_loss, g_loss = self.sess.run([self.disc_loss, self.genr_loss], feed_dict=feed_dict)
+        d_loss, g_loss = self.call_losses(*feeds)
         
         
         # ----------------------
@@ -166,8 +219,8 @@ class DiscoGAN(GAN):
         domain_A_samples = self.domain_A_set[idx_a]
         domain_B_samples = self.domain_B_set[idx_b]
         
-        self.sess.run(self.autoencode_train, feed_dict={self.enc_input: domain_A_samples, self.dec_input: domain_B_samples}) 
-        self.m_loss = self.sess.run(self.autoencode_loss, feed_dict={self.enc_input: domain_A_samples, self.dec_input: domain_B_samples})
+        self.call_autoencode_train(domain_A_samples, domain_B_samples)
+        self.m_loss = self.call_autoencode_loss(domain_A_samples, domain_B_samples)
         
         return d_loss, g_loss
         
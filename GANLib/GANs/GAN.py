@@ -6,6 +6,10 @@ from .. import utils
 from .. import distances
 
 import time
+import copy
+import json
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 
 #                   Generative Adversarial Network
 #   Paper: https://arxiv.org/pdf/1406.2661.pdf
@@ -17,6 +21,9 @@ import time
 
 
 class GAN(object):
+    # Inputs are created with self.placeholder, so they could be fed from graph tensors (see Sweep)
+    in_graph_inputs = True
+    
     def metric_test(self, set, pred_num = 32):    
         met_arr = np.zeros(pred_num)
         
@@ -28,11 +35,11 @@ class GAN(object):
         met_arr = self.metric_func(org_set, gen_set)
         return met_arr
 
-    def __init__(self, sess, input_shape, latent_dim = 100, optimizer = None, distance = None, metric = None, n_critic = 1):
+    def __init__(self, sess, input_shape, latent_dim = 100, optimizer = None, distance = None, metric = None, n_critic = 1, simultaneous = False, recompute = False, jit = False, augmentation = None, augment_fake = False,
+                 ema_decay = 0.999, ema_every = 1, ema_start = 0):
         self.input_shape = input_shape
         self.latent_dim = latent_dim
         
-        self.best_model = None
         self.best_metric = np.inf
         
         self.history = None
@@ -49,51 +56,120 @@ class GAN(object):
         else: self.metric_func = metric
         
         self.n_critic = n_critic
+        self.simultaneous = simultaneous
+        self.recompute = recompute
+        self.jit = jit
+        
+        # In-graph augmentation of discriminator inputs (see data.augmentation), 
+        # with augment_fake generated samples are augmented too
+        self.augmentation = augmentation
+        self.augment_fake = augment_fake
+        
+        # Moving average of generator weights (smooth generator): decay per step, averages are updated every ema_every 
+        # generator steps with decay ** ema_every, starting from step ema_start with a copy of current weights. 
+        # ema_decay = None disables it
+        self.ema_decay = ema_decay
+        self.ema_every = ema_every
+        self.ema_start = ema_start
+        self.genr_steps = 0
         
         self.sess = sess
         
+        # In-graph tensors used as default values of input placeholders (see placeholder)
+        self.input_tensors = {}
+        
+        self.sess.run(tf.variables_initializer([self.epoch, self.epochs]))
+        
         
     def set_models_params(self):
         if self.optimizer is None: self.optimizer = tf.train.AdamOptimizer(0.001, 0.5, epsilon = 1e-07)
         if self.distance is None: self.distance = distances.minmax
         
         self.models = ['generator', 'discriminator']
+        self.generator_scopes = ['G'] # variable scopes of models whose weights form the best model snapshot
+        self.ema_scopes = ['G'] # variable scopes of models read by smooth graph, their weights are averaged
+        
+    def model_scope(self, name, **kwargs):
+        self.model_scopes.add(name)
+        
+        # Recomputed subgraphs could only use resource variables
+        if self.recompute: kwargs['use_resource'] = True
+        return tf.variable_scope(name, reuse=tf.AUTO_REUSE, **kwargs)
+        
+    # Gradient checkpointing: only inputs and outputs of wrapped model are stored,
+    # all intermediate activations are recomputed during backward pass
+    def recompute_grad(self, model):
+        if not self.recompute: return model
+        return tf.contrib.layers.recompute_grad(model)
+        
+    # XLA compilation of all ops created inside the scope
+    @contextlib.contextmanager
+    def jit_scope(self):
+        if not self.jit:
+            yield
+        else:
+            with tf.contrib.compiler.jit.experimental_jit_scope():
+                yield
+        
+    # Trainable variables of model subgraph relative to variable scope the GAN is built in
+    def trainable_variables(self, name):
+        return tf.trainable_variables(self.scope_prefix + name + '/')
+        
+    # Placeholder that takes its value from self.input_tensors[name] when it is not fed
+    def placeholder(self, name, shape, dtype = tf.float32):
+        if name in self.input_tensors: 
+            return tf.placeholder_with_default(tf.cast(self.input_tensors[name], dtype), shape)
+        return tf.placeholder(dtype, shape=shape)
+        
+    # Discriminator inputs, optionally augmented. Returns examples and generator model as they are seen by discriminator
+    def augment_examples(self, real, fake, G):
+        if self.augmentation is None: return real, fake, G
+        real = self.augmentation(real)
+        if not self.augment_fake: return real, fake, G
+        
+        def G_augmented(*args):
+            return self.augmentation(G(*args))
+        return real, self.augmentation(fake), G_augmented
         
     def build_graph(self):
+        @self.recompute_grad
         def G(x):
-            with tf.variable_scope('G', reuse=tf.AUTO_REUSE) as scope:
+            with self.model_scope('G') as scope:
                 res = self.generator(x)
             return res
             
+        @self.recompute_grad
         def D(x):
-            with tf.variable_scope('D', reuse=tf.AUTO_REUSE) as scope:
+            with self.model_scope('D') as scope:
                 logits = self.discriminator(x)
             return logits
         
-        self.genr_input = tf.placeholder(tf.float32, shape=(None, self.latent_dim))
-        self.disc_input = tf.placeholder(tf.float32, shape=(None,) + self.input_shape)
+        self.genr_input = self.placeholder('genr_input', (None, self.latent_dim))
+        self.disc_input = self.placeholder('disc_input', (None,) + self.input_shape)
         
         
         self.genr = G(self.genr_input)
-        logit_real = D(self.disc_input)
-        logit_fake = D(self.genr)
+        real, fake, G_fake = self.augment_examples(self.disc_input, self.genr, G)
         
-        real = self.disc_input
-        fake = self.genr
+        logit_real = D(real)
+        logit_fake = D(fake)
         
         dist = self.distance(
             optimizer = self.optimizer, 
             logits = [logit_real, logit_fake], 
             examples = [real, fake], 
-            models = [G, D],
+            models = [G_fake, D],
             inputs = [self.genr_input, self.disc_input],
-            vars = [tf.trainable_variables('G'), tf.trainable_variables('D')],
+            vars = [self.trainable_variables('G'), self.trainable_variables('D')],
             gan = self
             )
             
         self.train_genr, self.train_disc = dist.get_train_sessions() 
         self.genr_loss, self.disc_loss = dist.get_losses()
         
+        if self.simultaneous:
+            self.train_both = dist.get_simultaneous_session()
+        
     def prepare_data(self, data_set, validation_split, batch_size):
         if 0. < validation_split < 1.:
             split_at = int(data_set.shape[0] * (1. - validation_split))
@@ -103,14 +179,52 @@ class GAN(object):
             self.train_set = data_set
             self.valid_set = None
     
+    # Copy of generator graph that reads its variables through custom_getter (moving averages)
+    def build_smooth_graph(self, custom_getter):
+        with self.model_scope('G', custom_getter = custom_getter):
+            self.smooth_genr = self.generator(self.genr_input)
+        
+    # Session callable with arguments in order of feed_list, they are converted to dtypes of placeholders
+    def make_callable(self, fetches, feed_list = []):
+        call = self.sess.make_callable(fetches, feed_list)
+        dtypes = [feed.dtype.as_numpy_dtype for feed in feed_list]
+        
+        def func(*args):
+            return call(*[np.asarray(arg, dtype) for arg, dtype in zip(args, dtypes)])
+        return func
+        
+    # Hot paths are compiled once, so each call skips feed and fetch resolution
+    def build_callables(self):
+        feeds = [self.disc_input, self.genr_input]
+        self.call_train_disc = self.make_callable(self.train_disc, feeds)
+        self.call_train_genr = self.make_genr_callable(self.train_genr, feeds, [self.train_genr])
+        self.call_losses = self.make_callable([self.disc_loss, self.genr_loss], feeds)
+        if self.simultaneous: self.call_train_both = self.make_genr_callable([self.train_both, self.disc_loss, self.genr_loss], feeds, [self.train_both])
+        
+        self.call_genr = self.make_callable(self.genr, [self.genr_input])
+        self.call_smooth_genr = self.make_callable(self.smooth_genr, [self.genr_input])
+        
     def predict(self, noise, moving_avarage = False):  
         if moving_avarage:
-            imgs = self.sess.run(self.smooth_genr, feed_dict = {self.genr_input: noise})
+            imgs = self.call_smooth_genr(noise)
         else:
-            imgs = self.sess.run(self.genr, feed_dict = {self.genr_input: noise})
+            imgs = self.call_genr(noise)
         return imgs
         
+    # Streams n generated samples into 'out' (see utils.write_chunks), next chunk is generated while current one is written
+    def generate(self, n, batch_size = 1024, out = None, moving_avarage = False):
+        def predict_chunk(chunk):
+            start, stop = chunk
+            noise = np.random.uniform(-1, 1, (stop - start, self.latent_dim))
+            return self.predict(noise, moving_avarage)
+            
+        chunks = utils.prefetch(predict_chunk, utils.chunk_ranges(n, batch_size))
+        return utils.write_chunks(chunks, out, n)
+        
     def train_on_batch(self, batch_size):
+        if self.simultaneous:
+            return self.train_on_batch_simultaneous(batch_size)
+            
         for j in range(self.n_critic):
             # Select a random batch of images
             idx = np.random.randint(0, self.train_set.shape[0], batch_size)
@@ -118,61 +232,197 @@ class GAN(object):
         
             # Sample noise as generator input
             noise = np.random.uniform(-1, 1, (batch_size, self.latent_dim))
-            self.sess.run(self.train_disc, feed_dict={self.disc_input: imgs, self.genr_input: noise})
+            self.call_train_disc(imgs, noise)
                         
         noise = np.random.uniform(-1, 1, (batch_size, self.latent_dim))
-        self.sess.run([self.train_genr], feed_dict={self.disc_input: imgs, self.genr_input: noise})
+        self.call_train_genr(imgs, noise)
         
-        d_loss, g_loss = self.sess.run([self.disc_loss, self.genr_loss], feed_dict={self.disc_input: imgs, self.genr_input: noise})
+        d_loss, g_loss = self.call_losses(imgs, noise)
         return d_loss, g_loss
         
+    # Generator and discriminator are updated at once from a single forward pass, losses are fetched from the same run
+    def train_on_batch_simultaneous(self, batch_size):
+        for j in range(self.n_critic - 1):
+            idx = np.random.randint(0, self.train_set.shape[0], batch_size)
+            imgs = self.train_set[idx]
+            noise = np.random.uniform(-1, 1, (batch_size, self.latent_dim))
+            self.call_train_disc(imgs, noise)
+            
+        idx = np.random.randint(0, self.train_set.shape[0], batch_size)
+        imgs = self.train_set[idx]
+        noise = np.random.uniform(-1, 1, (batch_size, self.latent_dim))
+        _, d_loss, g_loss = self.call_train_both(imgs, noise)
+        return d_loss, g_loss
         
-    def build_models(self, files = None, custom_objects = None):
+        
+    def build_models(self, files = None, custom_objects = None, save_best_model = False):
         for model in self.models:
             if not hasattr(self, model): raise Exception("%s are not defined!"%(model))
             
-        self.build_graph()
-        
-        #Smooth generator
-        ema = tf.train.ExponentialMovingAverage(decay = 0.999)
-        def ema_getter(getter, name, *args, **kwargs):
-            var = getter(name, *args, **kwargs)
-            ema_var = ema.average(var)
-            return ema_var if ema_var else var
-            
-        def Smooth_G(x):
-            with tf.variable_scope('G', reuse=tf.AUTO_REUSE, custom_getter = ema_getter):
-                res = self.generator(x)
-            return res   
+        scope_name = tf.get_variable_scope().name
+        self.scope_prefix = scope_name + '/' if scope_name else ''
+        
+        # Everything created from here on belongs to this GAN, as well as variables reused in its model scopes
+        n_vars = len(tf.get_collection_ref(tf.GraphKeys.GLOBAL_VARIABLES))
+        self.model_scopes = set()
             
-        self.smooth_genr = Smooth_G(self.genr_input)
+        with self.jit_scope():
+            self.build_graph()
+        
+        genr_vars = [v for name in self.generator_scopes for v in self.trainable_variables(name)]
         
-        #Initialize new variables
-        vars = tf.global_variables()
-        unint_vars_names = self.sess.run(tf.report_uninitialized_variables(vars))
-        unint_vars_names = [u.decode("utf-8") for u in unint_vars_names]
-        unint_vars = [ v for v in tf.global_variables() if v.name.split(':')[0] in unint_vars_names]
+        #Smooth generator, its averages are updated in the same run as generator step when it is due (see make_genr_callable)
+        self.ema = None
+        self.ema_vars = [v for name in self.ema_scopes for v in self.trainable_variables(name)]
+        ema_getter = None
         
-        self.sess.run(tf.variables_initializer(unint_vars))
-      
-        with tf.control_dependencies([self.train_genr]):
+        if self.ema_decay is not None:
+            ema = self.ema = tf.train.ExponentialMovingAverage(decay = self.ema_decay ** self.ema_every)
             with tf.variable_scope('', reuse=tf.AUTO_REUSE):
-                self.train_genr = ema.apply(tf.trainable_variables('G'))
-                
-        vars = tf.global_variables()
-        unint_vars_names = self.sess.run(tf.report_uninitialized_variables(vars))
-        unint_vars_names = [u.decode("utf-8") for u in unint_vars_names]
-        unint_vars = [ v for v in tf.global_variables() if v.name.split(':')[0] in unint_vars_names]
+                ema.apply(self.ema_vars)
+            
+            def ema_getter(getter, name, *args, **kwargs):
+                var = getter(name, *args, **kwargs)
+                ema_var = ema.average(var)
+                return ema_var if ema_var else var
+        
+        # Without moving averages smooth graph reads the current weights
+        with self.jit_scope():
+            self.build_smooth_graph(ema_getter)
+        
+        #Best model snapshot: non trainable copies of generator variables, saved and restored by grouped in-graph assigns.
+        #They are created only when best model is requested, so other GANs don't keep a second copy of generator weights
+        self.save_best = self.load_best = None
+        self.best_vars = []
+        if save_best_model:
+            with tf.name_scope('best_model'):
+                best_vars = self.best_vars = [tf.Variable(tf.zeros(v.shape, v.dtype.base_dtype), trainable = False, name = v.op.name[len(self.scope_prefix):]) for v in genr_vars]
+            self.save_best = tf.group(*[b.assign(v) for b, v in zip(best_vars, genr_vars)])
+            self.load_best = tf.group(*[v.assign(b) for b, v in zip(best_vars, genr_vars)])
+        
+        #Initialize variables created by this GAN and reused variables of its models that are not initialized in this session yet,
+        #so weights shared with other GANs in the same session are never reset
+        all_vars = tf.get_collection_ref(tf.GraphKeys.GLOBAL_VARIABLES)
+        prefixes = tuple(self.scope_prefix + name + '/' for name in self.model_scopes)
+        reused = [v for v in all_vars[:n_vars] if v.op.name.startswith(prefixes)]
+        self.variables = reused + all_vars[n_vars:]
+        
+        initialized = self.sess.run([tf.is_variable_initialized(v) for v in reused])
+        uninitialized = [v for v, init in zip(reused, initialized) if not init]
+        self.sess.run(tf.variables_initializer(uninitialized + all_vars[n_vars:]))
         
-        self.sess.run(tf.variables_initializer(unint_vars))
+        if save_best_model:
+            self.call_save_best = self.make_callable(self.save_best)
+            self.call_load_best = self.make_callable(self.load_best)
+        self.build_callables()
+                
                 
+    # Counts generator steps, returns which moving averages update is run after the current one: None, 
+    # 'reset' at the first update (averages start from current weights, so weights before ema_start are not mixed in) or 'update'
+    def ema_due(self):
+        self.genr_steps += 1
+        if self.ema is None or self.genr_steps < self.ema_start: return None
+        if (self.genr_steps - self.ema_start) % self.ema_every != 0: return None
+        return 'reset' if self.genr_steps - self.ema_every < max(self.ema_start, 1) else 'update'
+        
+    # Ops that update moving averages with weights produced by ops 'after', so they are run in the same session run
+    def build_ema_updates(self, after):
+        decay = self.ema_decay ** self.ema_every
+        with tf.control_dependencies(after):
+            values = [v.read_value() for v in self.ema_vars]
+        averages = [self.ema.average(v) for v in self.ema_vars]
+        return {'reset':  tf.group(*[a.assign(x) for a, x in zip(averages, values)]),
+                'update': tf.group(*[a.assign_sub((a - x) * (1. - decay)) for a, x in zip(averages, values)])}
+        
+    # Callable of the last step that updates generator weights (train_ops), moving averages are fetched with it when due
+    def make_genr_callable(self, fetches, feed_list, train_ops):
+        call = self.make_callable(fetches, feed_list)
+        calls = {}
+        if self.ema is not None:
+            calls = {due: self.make_callable([fetches, op], feed_list) for due, op in self.build_ema_updates(train_ops).items()}
+        
+        def func(*args):
+            due = self.ema_due()
+            if due is None: return call(*args)
+            return calls[due](*args)[0]
+        return func
+        
+    # Values of variables by their names, fetched with one run
+    def get_variables_values(self, variables = None):
+        if variables is None: variables = tf.global_variables()
+        values = self.sess.run(variables)
+        return {v.op.name: value for v, value in zip(variables, values)}
+        
+    # Assigns values to variables with matching names and shapes in one run by feeding their initializers
+    def load_variables_values(self, values, variables = None):
+        if variables is None: variables = tf.global_variables()
+        matched = [v for v in variables if v.op.name in values and v.shape.as_list() == list(np.shape(values[v.op.name]))]
+        feed_dict = {v.initializer.inputs[1]: values[v.op.name] for v in matched}
+        self.sess.run([v.initializer for v in matched], feed_dict = feed_dict)
+        return matched
+                
+    # Input and output tensors of exported inference graph
+    def export_signature(self, moving_avarage = False):
+        return [self.genr_input], self.smooth_genr if moving_avarage else self.genr
+        
+    def export(self, path, moving_avarage = False, **kwargs):
+        """Writes frozen inference graph of the generator, that can be loaded with inference.FrozenModel.
+        # Arguments
+            path:
+                File of serialized GraphDef, signature (input and output names) is written to path + '.json'.
+            moving_avarage:
+                Export smooth (moving average) generator.
+            **kwargs:
+                Other arguments of export_signature.
+        """
+        from tensorflow.tools.graph_transforms import TransformGraph
+        
+        inputs, output = self.export_signature(moving_avarage, **kwargs)
+        input_names = [t.op.name for t in inputs]
+        
+        # Inputs with in-graph default values (see placeholder) become plain placeholders, so defaults are not exported
+        graph_def = self.sess.graph.as_graph_def()
+        for node in graph_def.node:
+            if node.name in input_names:
+                node.op = 'Placeholder'
+                del node.input[:]
+        
+        # Only subgraph of the output is kept, variables are replaced by constants and constant subexpressions folded
+        graph_def = tf.graph_util.convert_variables_to_constants(self.sess, graph_def, [output.op.name])
+        graph_def = TransformGraph(graph_def, input_names, [output.op.name], ['fold_constants(ignore_errors=true)', 'fold_batch_norms', 'fold_old_batch_norms'])
+        
+        with tf.gfile.GFile(path, 'wb') as f:
+            f.write(graph_def.SerializeToString())
+        with open(path + '.json', 'w') as f:
+            json.dump({'inputs': [t.name for t in inputs], 'output': output.name}, f, indent = 2)
                 
     def test_network(self, batch_size):
         metric = self.metric_test(self.train_set, batch_size)    
         return {'metric': metric}
         
     
-    def train(self, data_set, batch_size=32, epochs=1, verbose=True, checkpoint_range = 100, checkpoint_callback = None, validation_split = 0, save_best_model = False, collect_history = True):
+    def update_history(self, history, max_hist_size, d_loss, g_loss):
+        dict_of_vals = self.test_network(128)
+        dict_of_vals['D loss'] = d_loss
+        dict_of_vals['G loss'] = g_loss
+        
+        hist_size = history['hist_size'] = history['hist_size']+1
+        
+        for k, v in dict_of_vals.items():
+            if k not in history:
+                history[k] = np.zeros((max_hist_size,3))
+            
+            history[k][hist_size-1] = np.mean(v),  np.min(v),  np.max(v)
+            
+        return np.mean(dict_of_vals['metric'])
+        
+    # Training state that is not stored in variables
+    def training_state(self, epoch, history, best_saved):
+        return {'epoch': epoch, 'history': copy.deepcopy(history), 'best_metric': self.best_metric, 
+                'best_saved': best_saved, 'genr_steps': self.genr_steps, 'random_state': np.random.get_state()}
+        
+    def train(self, data_set, batch_size=32, epochs=1, verbose=True, checkpoint_range = 100, checkpoint_callback = None, validation_split = 0, save_best_model = False, collect_history = True,
+              save_file = None, save_range = 1000, resume_from = None):
         """Trains the model for a given number of epochs (iterations on a dataset).
         # Arguments
             data_set: 
@@ -196,8 +446,15 @@ class GAN(object):
                 The validation data is selected from the last samples.
             save_best_model:
                 Boolean. If True, generator weights will be resigned to best model according to chosen metric.
+                Best model is kept in graph as copy of variables of 'generator_scopes'.
             collect_history:
                 Boolean. If True, all training history will store into 'history' object. Sometimes it might be computationally expensive.
+            save_file:
+                Npz file where all variables of the GAN (including optimizer slots and moving averages), epoch, history
+                and numpy random state are saved every 'save_range' epochs and at the end of training. 
+                Values are fetched in one run and written to disk by a background thread.
+            resume_from:
+                Npz file written through 'save_file', training continues from the saved epoch.
         # Returns
             A history object. 
         """ 
@@ -213,11 +470,36 @@ class GAN(object):
         # Build Network
         
         self.prepare_data(data_set, validation_split, batch_size)
-        self.build_models()
+        self.build_models(save_best_model = save_best_model)
+        
+        best_saved = False
+        start_epoch = 0
+        
+        if resume_from is not None:
+            values, state = utils.load_checkpoint(resume_from)
+            matched = set(v.op.name for v in self.load_variables_values(values, self.variables))
+            
+            # Training is never continued from a late epoch with freshly initialized weights,
+            # only best model snapshot could be missing (checkpoint written without save_best_model)
+            best_names = set(v.op.name for v in self.best_vars)
+            missing = [v.op.name for v in self.variables if v.op.name not in matched and v.op.name not in best_names]
+            if len(missing) > 0:
+                raise Exception('Checkpoint %s does not match the model, %d variables are missing or have other shape: %s' % (resume_from, len(missing), ', '.join(missing[:10])))
+            
+            start_epoch = state['epoch']
+            history = self.history = state['history']
+            self.best_metric = state['best_metric']
+            best_saved = state['best_saved'] and save_best_model and best_names <= matched
+            self.genr_steps = state['genr_steps']
+            np.random.set_state(state['random_state'])
+        
+        # One checkpoint is written at a time, while the next one is not fetched yet
+        saver = ThreadPoolExecutor(max_workers = 1) if save_file is not None else None
+        saving = None
         
         t = time.time()
         # Train Network
-        for epoch in range(epochs):
+        for epoch in range(start_epoch, epochs):
             self.epoch.load(epoch, self.sess)
             
             d_loss, g_loss = self.train_on_batch(batch_size)
@@ -230,36 +512,39 @@ class GAN(object):
                 if not collect_history:
                     if verbose: print('%d [D loss: %f] [G loss: %f] time: %f' % (epoch, d_loss, g_loss, d_t))
                 else:
-                    dict_of_vals = self.test_network(128)
-                    dict_of_vals['D loss'] = d_loss
-                    dict_of_vals['G loss'] = g_loss
-                    
-                    hist_size = history['hist_size'] = history['hist_size']+1
-                    metric = np.mean(dict_of_vals['metric'])
-                    
-                    for k, v in dict_of_vals.items():
-                        if k not in history:
-                            history[k] = np.zeros((max_hist_size,3))
-                        
-                        history[k][hist_size-1] = np.mean(v),  np.min(v),  np.max(v)
+                    metric = self.update_history(history, max_hist_size, d_loss, g_loss)
                     
                     if verbose: print ("%d [D loss: %f] [G loss: %f] [%s: %f] time: %f" % (epoch, d_loss, g_loss, 'metric', metric, d_t))
                     
-                    if metric < self.best_metric:  #or self.best_model == None:
-                        #self.best_model = self.generator.get_weights()
+                    if metric < self.best_metric:
                         self.best_metric = metric
                         history['best_metric'] = self.best_metric
                         
+                        if save_best_model: 
+                            self.call_save_best()
+                            best_saved = True
+                        
                     self.history = history
                 
                 if checkpoint_callback is not None:
                     checkpoint_callback()
-        
-        if save_best_model:
-            self.generator.set_weights(self.best_model)    
+                    
+            if saver is not None and ((epoch + 1) % save_range == 0 or epoch + 1 == epochs):
+                values = self.get_variables_values(self.variables)
+                state = self.training_state(epoch + 1, history, best_saved)
+                if saving is not None: saving.result()
+                saving = saver.submit(utils.save_checkpoint, save_file, values, state)
+        
+        if saver is not None: 
+            saver.shutdown(wait = True)
+            if saving is not None: saving.result()
+        
+        if best_saved:
+            self.call_load_best()
             
         self.epoch.load(epochs, self.sess)
-        checkpoint_callback()  
+        if checkpoint_callback is not None:
+            checkpoint_callback()  
         return self.history   
 
     def save_history_to_image(self, file):
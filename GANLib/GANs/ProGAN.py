@@ -0,0 +1,110 @@
+import tensorflow as tf
+import numpy as np
+
+
+from .. import metrics
+from .. import utils
+from .. import distances
+from .GAN import GAN
+
+#                   Progressive Growing of GANs
+#   Paper: https://arxiv.org/pdf/1710.10196.pdf
+
+#       Description:
+#   Trains GAN stage by stage, progressively adding layers to generator and discriminator.
+#   Models are defined as stage_generator(x, stage, alpha) and stage_discriminator(x, stage, alpha),
+#   where alpha is in-graph transition coefficient that goes from 0 to 1 during the first half of the stage.
+#   Every stage is rebuilt in a new graph with a new optimizer (optimizer argument is a function that creates it),
+#   and all variables that already exist (layer weights, optimizer slots, moving averages) are carried over
+#   from the previous stage by name, so only new layers and their optimizer slots are initialized.
+#   Rebuild costs one graph construction and one copy of weights through numpy per stage, in exchange
+#   graph size does not grow with the number of stages and the previous stage graph can be released.
+
+class ProGAN(GAN):
+    def __init__(self, sess, input_shapes, latent_dim = 100, config = None, optimizer = None, **kwargs):
+        # Optimizer keeps its slots by graph, so the one of the previous stage would keep its graph alive
+        if isinstance(optimizer, tf.train.Optimizer): 
+            raise Exception('ProGAN optimizer should be a function that creates optimizer, new one is created for every stage')
+        self.optimizer_factory = optimizer if optimizer is not None else lambda: tf.train.AdamOptimizer(0.001, 0., 0.99, epsilon = 1e-08)
+        
+        super(ProGAN, self).__init__(sess, input_shapes[0], latent_dim , **kwargs)
+        self.input_shapes = input_shapes
+        self.stage = 0
+
+        # Session config for graphs of the next stages
+        self.config = config
+        self.own_sess = False
+        self.carried_values = {}
+
+    def set_models_params(self):
+        if self.optimizer is None: self.optimizer = self.optimizer_factory()
+        if self.distance is None: self.distance = distances.wasserstein_gp
+
+        self.models = ['stage_generator', 'stage_discriminator']
+        self.generator_scopes = ['G']
+        self.ema_scopes = ['G']
+
+    def generator(self, x):
+        return self.stage_generator(x, self.stage, self.transition_alpha)
+
+    def discriminator(self, x):
+        return self.stage_discriminator(x, self.stage, self.transition_alpha)
+
+    def build_graph(self):
+        epoch = tf.cast(self.epoch, tf.float32)
+        epochs = tf.cast(self.epochs, tf.float32)
+        self.transition_alpha = tf.minimum(epoch / (epochs / 2), 1.)
+
+        super(ProGAN, self).build_graph()
+
+    def build_models(self, files = None, custom_objects = None, save_best_model = False):
+        super(ProGAN, self).build_models(files, custom_objects, save_best_model)
+
+        # Overwrite initial values of variables that existed at the previous stage
+        self.load_variables_values(self.carried_values, self.variables)
+        self.carried_values = {}
+
+    def next_stage(self):
+        # Only variables of the model are carried, epoch counters are set by train for every stage
+        self.carried_values = self.get_variables_values(self.variables)
+
+        # Previous stage graph is released once build_models of the new stage replaces its tensors
+        sess = tf.Session(graph = tf.Graph(), config = self.config)
+        if self.own_sess: self.sess.close()
+        self.sess = sess
+        self.own_sess = True
+        self.optimizer = self.optimizer_factory()
+
+        self.stage += 1
+        self.input_shape = self.input_shapes[self.stage]
+        self.best_metric = np.inf
+
+        with self.sess.graph.as_default():
+            self.epoch = tf.Variable(0)
+            self.epochs = tf.Variable(0)
+            self.sess.run(tf.variables_initializer([self.epoch, self.epochs]))
+
+    def train(self, data_sets, epochs_list, batch_size_list, **kwargs):
+        """Trains the model stage by stage, each stage is trained with GAN.train.
+        # Arguments
+            data_sets:
+                List of numpy arrays of training data for every stage, or function data_sets(stage) that returns it.
+            epochs_list:
+                Number of epochs for every stage.
+            batch_size_list:
+                Batch size for every stage.
+            **kwargs:
+                Other arguments of GAN.train.
+        # Returns
+            A list of history objects of every stage.
+        """
+        histories = []
+        for stage in range(self.stage, len(epochs_list)):
+            if stage > self.stage: self.next_stage()
+
+            data_set = data_sets(stage) if callable(data_sets) else data_sets[stage]
+            with self.sess.graph.as_default():
+                history = super(ProGAN, self).train(data_set, batch_size = batch_size_list[stage], epochs = epochs_list[stage], **kwargs)
+            histories.append(history)
+
+        return histories
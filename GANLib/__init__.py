@@ -1,14 +1,46 @@
 from __future__ import absolute_import
 
+import sys
+import importlib
 
-from . import distances
-from . import metrics
-from . import utils
+# Submodules and classes are imported on first attribute access (PEP 562), 
+# so 'import GANLib' does not load tensorflow, matplotlib or scipy until they are needed
 
-from .GANs.GAN import GAN #main class
-from .GANs.AAE import AAE
-from .GANs.CGAN import CGAN
-from .GANs.DiscoGAN import DiscoGAN
-from .GANs.Pix2Pix import Pix2Pix
+_submodules = ['distances', 'metrics', 'utils', 'data', 'sweep', 'runner', 'tuner', 'inference', 'server', 'distillation']
+
+_attributes = {
+    'GAN':             '.GANs.GAN', #main class
+    'AAE':             '.GANs.AAE',
+    'CGAN':            '.GANs.CGAN',
+    'DiscoGAN':        '.GANs.DiscoGAN',
+    'Pix2Pix':         '.GANs.Pix2Pix',
+    'ProGAN':          '.GANs.ProGAN',
+
+    'Sweep':           '.sweep',
+    'run_experiments': '.runner',
+    'tuned_session':   '.tuner',
+    'FrozenModel':     '.inference',
+    'BatchServer':     '.server',
+    'Distillation':    '.distillation',
+}
 
 __version__ = '0.0.6'
+__all__ = _submodules + list(_attributes)
+
+def __getattr__(name):
+    if name in _submodules:
+        value = importlib.import_module('.' + name, __name__)
+    elif name in _attributes:
+        value = getattr(importlib.import_module(_attributes[name], __name__), name)
+    else:
+        raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+    
+    globals()[name] = value
+    return value
+    
+def __dir__():
+    return sorted(list(globals()) + __all__)
+    
+# Module __getattr__ is supported since Python 3.7, older versions import everything eagerly
+if sys.version_info < (3, 7):
+    for _name in __all__: __getattr__(_name)
@@ -0,0 +1,211 @@
+import numpy as np
+import tensorflow as tf
+
+import os
+import json
+import hashlib
+
+from . import utils
+
+#                   Dataset pyramid
+#       Description:
+#   Precomputes every resolution level of image dataset once (box or bilinear downsampling)
+#   and stores it as uint8, optionally on disk as level_<size>.npy files with fingerprint of source
+#   dataset in pyramid.json, so levels of another dataset are never reused. Level of current stage
+#   is served through ScaledArray, that converts only requested batches to float32 in [-1, 1],
+#   so neither full size float copy of dataset nor its copy in the graph is needed.
+#
+#                   Augmentation
+#       Description:
+#   In-graph per batch augmentation of discriminator inputs (pixel shifts, flips, color jitter).
+#   Dataset stays 1x in memory and every step sees new augmented samples. All ops are
+#   differentiable, so the same augmentation can be applied to generated samples as well.
+
+
+# ---------------
+#  Pyramid
+# ---------------
+
+class ScaledArray(object):
+    def __init__(self, data, scale = 127.5, offset = -1.):
+        self.data = data
+        self.scale = scale
+        self.offset = offset
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, key):
+        # Slices of memmap are still lazy, so slices (validation split) stay scaled views
+        if isinstance(key, slice):
+            return ScaledArray(self.data[key], self.scale, self.offset)
+        return self.data[key].astype(np.float32) / self.scale + self.offset
+
+
+def to_uint8(data):
+    if data.dtype == np.uint8: return data
+    return np.clip(np.rint((data + 1.) * 127.5), 0, 255).astype(np.uint8)
+
+#Matrix of weights that resizes axis of length n_in to n_out with half pixel centers,
+#same sampling as tf.image.resize_bilinear(half_pixel_centers = True) or tf.image.resize of TF2
+def bilinear_weights(n_in, n_out):
+    pos = np.clip((np.arange(n_out) + 0.5) * n_in / n_out - 0.5, 0, n_in - 1)
+    low = np.floor(pos).astype(int)
+    high = np.minimum(low + 1, n_in - 1)
+    frac = pos - low
+
+    w = np.zeros((n_out, n_in), dtype = np.float32)
+    w[np.arange(n_out), low] += 1. - frac
+    w[np.arange(n_out), high] += frac
+    return w
+
+def downsample(images, size, mode = 'box'):
+    n, h, w, c = images.shape
+    images = images.astype(np.float32)
+
+    if mode == 'box' and h % size[0] == 0 and w % size[1] == 0:
+        images = images.reshape((n, size[0], h // size[0], size[1], w // size[1], c)).mean(axis = (2, 4))
+    elif mode in ('box', 'bilinear'):
+        images = np.einsum('yh,nhwc,xw->nyxc', bilinear_weights(h, size[0]), images, bilinear_weights(w, size[1]))
+    else:
+        raise Exception('Unknown downsampling mode: ' + str(mode))
+
+    return np.clip(np.rint(images), 0, 255).astype(np.uint8)
+
+
+#Number of samples, sample shape, downsampling mode and checksum of evenly spaced samples of source dataset
+def fingerprint(data, mode, n_samples = 64):
+    idx = np.linspace(0, data.shape[0] - 1, min(data.shape[0], n_samples)).astype(np.int64)
+    samples = np.ascontiguousarray(to_uint8(np.asarray(data[idx])))
+    return {'n': int(data.shape[0]), 'shape': [int(d) for d in data.shape[1:]], 'mode': mode, 'checksum': hashlib.sha1(samples.tobytes()).hexdigest()}
+
+
+class Pyramid(object):
+    def __init__(self, data, sizes, mode = 'box', path = None, batch_size = 1024):
+        """Multi-resolution cache of image dataset.
+        # Arguments
+            data:
+                Numpy array of images NHWC, uint8 or float in [-1, 1]. Can be None if all levels are already stored at 'path'.
+            sizes:
+                List of image sizes (int or (height, width)) for every level.
+            mode:
+                'box' (exact block averaging, falls back to bilinear for non integer factors) or 'bilinear'.
+            path:
+                Directory where levels are stored. Existing levels are reused and served by memmap, if they
+                were computed from the same data (see fingerprint) or data is None.
+            batch_size:
+                Number of images downsampled at once.
+        """
+        self.sizes = [(s, s) if np.isscalar(s) else tuple(s) for s in sizes]
+        self.mode = mode
+        self.path = path
+        self.levels = []
+
+        if path is not None and not os.path.isdir(path): os.makedirs(path)
+
+        # Cached levels of another dataset are stale, fingerprint is removed until all levels are rewritten
+        stale = False
+        if path is not None and data is not None:
+            info_file = os.path.join(path, 'pyramid.json')
+            info = fingerprint(data, mode)
+            if os.path.exists(info_file):
+                with open(info_file) as f:
+                    stale = json.load(f) != info
+                if stale: os.remove(info_file)
+            else:
+                stale = True
+
+        for size in self.sizes:
+            file = None if path is None else os.path.join(path, 'level_%dx%d.npy'%size)
+            if file is not None and os.path.exists(file) and not stale:
+                level = np.load(file, mmap_mode = 'r')
+            else:
+                if data is None: raise Exception('Level %dx%d is not cached, data is required'%size)
+                chunks = (downsample(to_uint8(np.asarray(chunk)), size, mode) for chunk in utils.iterate_chunks(data, batch_size))
+                if file is None:
+                    level = utils.write_chunks(chunks, None, data.shape[0])
+                else:
+                    # Level is written to temporary file and renamed, so interrupted write is never reused as cached level
+                    tmp_file = file + '.tmp.npy'
+                    level = utils.write_chunks(chunks, tmp_file, data.shape[0])
+                    del level
+                    os.replace(tmp_file, file)
+                    level = np.load(file, mmap_mode = 'r')
+            self.levels.append(level)
+
+        if stale:
+            tmp_file = info_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump(info, f, indent = 2)
+            os.replace(tmp_file, info_file)
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __getitem__(self, stage):
+        return ScaledArray(self.levels[stage])
+
+    def __call__(self, stage):
+        return self[stage]
+
+
+# ---------------
+#  Augmentation
+# ---------------
+
+#Shifts every sample by random integer offset in [-max_shift, max_shift] along both axes, borders are replicated
+def random_shift(x, max_shift = 1):
+    shape = tf.shape(x)
+    n, h, w = shape[0], shape[1], shape[2]
+    shift = tf.random_uniform([n, 2], -max_shift, max_shift + 1, dtype = tf.int32)
+
+    rows = tf.clip_by_value(tf.range(h)[None, :] - shift[:, :1], 0, h - 1)
+    cols = tf.clip_by_value(tf.range(w)[None, :] - shift[:, 1:], 0, w - 1)
+
+    idx = tf.stack([
+        tf.tile(tf.range(n)[:, None, None], [1, h, w]),
+        tf.tile(rows[:, :, None], [1, 1, w]),
+        tf.tile(cols[:, None, :], [1, h, 1])], axis = -1)
+    return tf.gather_nd(x, idx)
+
+#Flips half of samples horizontally
+def random_flip(x):
+    mask = tf.cast(tf.random_uniform([tf.shape(x)[0], 1, 1, 1]) < 0.5, x.dtype)
+    return mask * tf.reverse(x, [2]) + (1. - mask) * x
+
+#Color jitter for data in [-1, 1]: brightness offset in [-strength, strength], saturation and contrast factors in [1 - strength, 1 + strength]
+def random_brightness(x, strength = 0.5):
+    return x + tf.random_uniform([tf.shape(x)[0], 1, 1, 1], -strength, strength)
+
+def random_saturation(x, strength = 1.):
+    mean = tf.reduce_mean(x, axis = -1, keepdims = True)
+    return (x - mean) * tf.random_uniform([tf.shape(x)[0], 1, 1, 1], 1. - strength, 1. + strength) + mean
+
+def random_contrast(x, strength = 0.5):
+    mean = tf.reduce_mean(x, axis = [1, 2, 3], keepdims = True)
+    return (x - mean) * tf.random_uniform([tf.shape(x)[0], 1, 1, 1], 1. - strength, 1. + strength) + mean
+
+def augmentation(shift = 1, flip = False, brightness = 0., saturation = 0., contrast = 0.):
+    """Creates augmentation function for GAN 'augmentation' argument.
+    # Arguments
+        shift:
+            Maximal pixel shift along each axis, 0 disables it.
+        flip:
+            Random horizontal flips.
+        brightness, saturation, contrast:
+            Strength of color jitter, 0 disables it.
+    # Returns
+        A function that maps batch of images NHWC to augmented batch.
+    """
+    def func(x):
+        if shift > 0: x = random_shift(x, shift)
+        if flip: x = random_flip(x)
+        if brightness > 0: x = random_brightness(x, brightness)
+        if saturation > 0: x = random_saturation(x, saturation)
+        if contrast > 0: x = random_contrast(x, contrast)
+        return x
+    return func
@@ -51,6 +51,16 @@ class distance(object):
     
     def get_losses(self):
         pass
+        
+    def get_gradients(self):
+        genr_grads = self.optimizer.compute_gradients(self.genr_loss, var_list=self.genr_vars)
+        disc_grads = self.optimizer.compute_gradients(self.disc_loss, var_list=self.disc_vars)
+        return genr_grads, disc_grads
+        
+    # both gradient sets are computed from the same forward pass and applied by one grouped op
+    def get_simultaneous_session(self):
+        genr_grads, disc_grads = self.get_gradients()
+        return self.optimizer.apply_gradients(genr_grads + disc_grads)
 
 
 # distances from the original paper: https://arxiv.org/pdf/1406.2661.pdf        
@@ -110,6 +120,12 @@ class wasserstein(distance):
     
     def get_train_sessions(self):
         return self.train_genr, tf.group(self.train_disc, self.disc_clip)
+        
+    def get_simultaneous_session(self):
+        train = super(wasserstein, self).get_simultaneous_session()
+        with tf.control_dependencies([train]):
+            clip = [v.assign(tf.clip_by_value(v, -0.01, 0.01)) for v in self.disc_vars]
+        return tf.group(*clip)
     
     def get_losses(self):
         return self.genr_loss, self.disc_loss
@@ -0,0 +1,150 @@
+import tensorflow as tf
+import numpy as np
+
+import time
+
+from . import metrics
+
+#                   Generator distillation
+#       Description:
+#   Trains smaller student generator to reproduce outputs of trained GAN (its smooth generator
+#   by default) for the same inputs: pixel loss between student and teacher outputs plus optional
+#   feature loss, the difference of teacher discriminator responses to both outputs.
+#   Student is built in variable scope 'S' of teacher graph and takes the same inputs as teacher
+#   predict (see export_signature), so it works with any GAN class.
+
+class Distillation(object):
+    def __init__(self, teacher, student, optimizer = None, feature_weight = 0., moving_avarage = True, sample_inputs = None):
+        """
+        # Arguments
+            teacher:
+                Trained GAN, its models should be built.
+            student:
+                Function student(*inputs) that defines student model, inputs are the same as of teacher predict.
+            optimizer:
+                Optimizer of student, Adam by default.
+            feature_weight:
+                Weight of feature loss, it requires teacher with discriminator(x) model (GAN, ProGAN).
+            moving_avarage:
+                Distill smooth generator of teacher.
+            sample_inputs:
+                Function sample_inputs(batch_size) that returns list of teacher inputs. By default uniform
+                noise in [-1, 1] is sampled for every (latent) input.
+        """
+        self.teacher = teacher
+        self.student = student
+        self.sess = teacher.sess
+
+        self.optimizer = optimizer if optimizer is not None else tf.train.AdamOptimizer(0.001, 0.5, epsilon = 1e-07)
+        self.feature_weight = feature_weight
+        self.moving_avarage = moving_avarage
+        self.sample_inputs = sample_inputs if sample_inputs is not None else self.sample_noise
+
+        self.history = None
+
+    def sample_noise(self, batch_size):
+        inputs = []
+        for t in self.inputs:
+            if t.dtype.is_integer: raise Exception('Input %s can not be sampled, sample_inputs is required' % t.name)
+            inputs.append(np.random.uniform(-1, 1, (batch_size,) + tuple(t.shape[1:].as_list())))
+        return inputs
+
+    # Teacher discriminator response, its variables are reused
+    def discriminator(self, x):
+        with tf.variable_scope(self.teacher.scope_prefix + 'D', reuse = tf.AUTO_REUSE):
+            return self.teacher.discriminator(x)
+
+    def build_models(self):
+        teacher = self.teacher
+        self.scope = teacher.scope_prefix + 'S'
+
+        with self.sess.graph.as_default():
+            n_vars = len(tf.get_collection_ref(tf.GraphKeys.GLOBAL_VARIABLES))
+
+            self.inputs, self.teacher_genr = teacher.export_signature(self.moving_avarage)
+            with tf.variable_scope(self.scope, reuse = tf.AUTO_REUSE):
+                self.genr = self.student(*self.inputs)
+
+            target = tf.stop_gradient(self.teacher_genr)
+            self.pixel_loss = tf.reduce_mean(tf.squared_difference(self.genr, target))
+            self.loss = self.pixel_loss
+
+            if self.feature_weight > 0:
+                self.feature_loss = tf.reduce_mean(tf.squared_difference(self.discriminator(self.genr), tf.stop_gradient(self.discriminator(target))))
+                self.loss = self.loss + self.feature_weight * self.feature_loss
+
+            self.train_student = self.optimizer.minimize(self.loss, var_list = tf.trainable_variables(self.scope + '/'))
+
+            self.variables = tf.get_collection_ref(tf.GraphKeys.GLOBAL_VARIABLES)[n_vars:]
+            self.sess.run(tf.variables_initializer(self.variables))
+
+        self.call_train = teacher.make_callable([self.train_student, self.loss], self.inputs)
+        self.call_genr = teacher.make_callable(self.genr, self.inputs)
+        self.call_teacher = teacher.make_callable(self.teacher_genr, self.inputs)
+
+    def predict(self, *inputs):
+        return self.call_genr(*inputs)
+
+    def train(self, epochs = 1, batch_size = 32, verbose = True, checkpoint_range = 100, checkpoint_callback = None):
+        """Trains student for a given number of epochs (batches of sampled inputs).
+        # Returns
+            A history object with distillation loss.
+        """
+        self.build_models()
+
+        history = {'hist_size': 0, 'loss': np.zeros((epochs // checkpoint_range + 1, 3))}
+
+        t = time.time()
+        for epoch in range(epochs):
+            _, loss = self.call_train(*self.sample_inputs(batch_size))
+
+            if epoch % checkpoint_range == 0:
+                d_t = time.time() - t
+                t = time.time()
+
+                history['loss'][history['hist_size']] = loss, loss, loss
+                history['hist_size'] += 1
+                self.history = history
+
+                if verbose: print('%d [Distillation loss: %f] time: %f' % (epoch, loss, d_t))
+                if checkpoint_callback is not None: checkpoint_callback()
+
+        return self.history
+
+    def report(self, data_set = None, n = 1024, batch_size = 256, verbose = True):
+        """Compares student with teacher.
+        # Arguments
+            data_set:
+                Real samples to compute teacher metric of both generators. If None only distance
+                between student and teacher outputs is reported.
+            n:
+                Number of generated samples, timed in batches of batch_size.
+        # Returns
+            Dict with generation time of both models, speedup and metrics.
+        """
+        batches = [self.sample_inputs(batch_size) for i in range(max(1, n // batch_size))]
+
+        def timed(func):
+            func(*batches[0]) # warm up
+            t = time.time()
+            outputs = [func(*inputs) for inputs in batches]
+            return time.time() - t, np.concatenate(outputs)
+
+        teacher_time, teacher_set = timed(self.call_teacher)
+        student_time, student_set = timed(self.call_genr)
+
+        report = {'teacher_time': teacher_time,
+                  'student_time': student_time,
+                  'speedup': teacher_time / student_time,
+                  'teacher_distance': float(np.mean(metrics.magic_distance(teacher_set[:batch_size], student_set[:batch_size])))}
+
+        if data_set is not None:
+            idx = np.random.choice(data_set.shape[0], batch_size)
+            real_set = data_set[idx]
+            report['teacher_metric'] = float(np.mean(self.teacher.metric_func(real_set, teacher_set[:batch_size])))
+            report['student_metric'] = float(np.mean(self.teacher.metric_func(real_set, student_set[:batch_size])))
+            report['metric_change'] = report['student_metric'] - report['teacher_metric']
+
+        if verbose:
+            for k, v in report.items(): print('%s: %f' % (k, v))
+        return report
@@ -0,0 +1,151 @@
+import tensorflow as tf
+import numpy as np
+
+import os
+import json
+import shutil
+import tempfile
+
+from . import metrics
+
+#                   Frozen model
+#       Description:
+#   Loads generator graph written by GAN.export: only the inference subgraph with
+#   weights folded into constants, so it starts fast and keeps only the generator in memory.
+#   predict takes the same inputs as predict of the exported GAN.
+#
+#                   Quantization
+#       Description:
+#   Post-training quantization of exported graphs for CPU inference: 8 bit weights only, or
+#   8 bit weights and activations with requantization ranges calibrated on sample inputs.
+#   Quantized outputs are compared with float outputs to check fidelity.
+
+def read_graph_def(path):
+    graph_def = tf.GraphDef()
+    with tf.gfile.GFile(path, 'rb') as f:
+        graph_def.ParseFromString(f.read())
+    return graph_def
+    
+# Integer inputs are sparse labels, flattened as in CGAN.predict
+def make_feed_dict(tensors, values):
+    return {t: np.reshape(x, (-1,)) if t.dtype.is_integer else x for t, x in zip(tensors, values)}
+    
+def write_graph_def(graph_def, signature, path):
+    with tf.gfile.GFile(path, 'wb') as f:
+        f.write(graph_def.SerializeToString())
+    with open(path + '.json', 'w') as f:
+        json.dump(signature, f, indent = 2)
+        
+
+class FrozenModel(object):
+    def __init__(self, path, config = None):
+        with open(path + '.json') as f:
+            signature = json.load(f)
+        
+        self.signature = signature
+        
+        # GraphDef is not kept after import, so model holds only one copy of its weights (in the graph)
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            tf.import_graph_def(read_graph_def(path), name = '')
+            
+        self.inputs = [self.graph.get_tensor_by_name(name) for name in signature['inputs']]
+        self.output = self.graph.get_tensor_by_name(signature['output'])
+        
+        self.sess = tf.Session(graph = self.graph, config = config)
+        
+    def predict(self, *inputs):
+        return self.sess.run(self.output, feed_dict = make_feed_dict(self.inputs, inputs))
+        
+    def close(self):
+        self.sess.close()
+        
+        
+# ---------------
+#  Quantization
+# ---------------
+
+#Batches of uniform noise in [-1, 1] for every float input of the model (latent inputs of generators)
+def sample_inputs(model, batch_size = 64, batches = 8):
+    shapes = []
+    for t in model.inputs:
+        if t.dtype.is_integer or not t.shape[1:].is_fully_defined(): 
+            raise Exception('Inputs of %s can not be sampled, calibration inputs are required' % t.name)
+        shapes.append(tuple(t.shape[1:].as_list()))
+    return [[np.random.uniform(-1, 1, (batch_size,) + shape) for shape in shapes] for i in range(batches)]
+    
+#Writes min and max of every RequantizationRange op over calibration batches in the format of insert_logging transform
+def calibrate(graph_def, signature, calibration_inputs, log_file):
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.import_graph_def(graph_def, name = '')
+    inputs = [graph.get_tensor_by_name(name) for name in signature['inputs']]
+    ranges = [op for op in graph.get_operations() if op.type == 'RequantizationRange']
+    
+    with tf.Session(graph = graph) as sess:
+        values = [sess.run([op.outputs for op in ranges], feed_dict = make_feed_dict(inputs, batch)) for batch in calibration_inputs]
+    
+    with open(log_file, 'w') as f:
+        for i, op in enumerate(ranges):
+            range_min = min(v[i][0] for v in values)
+            range_max = max(v[i][1] for v in values)
+            f.write(';%s__print__;__requant_min_max:[%f][%f]\n' % (op.name, range_min, range_max))
+    
+def quantize(path, out_path, mode = 'weights', calibration_inputs = None, check_inputs = None):
+    """Quantizes graph exported with GAN.export, result can be loaded with FrozenModel.
+    # Arguments
+        path:
+            Exported float graph.
+        out_path:
+            File of quantized graph.
+        mode:
+            'weights' (8 bit weights, float computations) or 'full' (8 bit weights and activations).
+        calibration_inputs:
+            List of batches, each batch is a list of inputs of predict, used to calibrate activation ranges 
+            in 'full' mode. By default uniform noise is sampled for generators latent inputs.
+        check_inputs:
+            Inputs of predict to compare float and quantized outputs, by default the first calibration batch.
+    # Returns
+        Dict with fidelity check: magic distance (see metrics) between float and quantized outputs, 
+        mean and max absolute error and size of both graphs in bytes.
+    """
+    from tensorflow.tools.graph_transforms import TransformGraph
+    
+    model = FrozenModel(path)
+    if calibration_inputs is None: calibration_inputs = sample_inputs(model)
+    if check_inputs is None: check_inputs = calibration_inputs[0]
+    
+    input_names = [t.op.name for t in model.inputs]
+    output_names = [model.output.op.name]
+    
+    float_graph_def = read_graph_def(path)
+    if mode == 'weights':
+        graph_def = TransformGraph(float_graph_def, input_names, output_names, ['quantize_weights'])
+    elif mode == 'full':
+        graph_def = TransformGraph(float_graph_def, input_names, output_names, ['add_default_attributes', 'quantize_weights', 'quantize_nodes'])
+        
+        log_dir = tempfile.mkdtemp()
+        try:
+            log_file = os.path.join(log_dir, 'min_max_log.txt')
+            calibrate(graph_def, model.signature, calibration_inputs, log_file)
+            graph_def = TransformGraph(graph_def, input_names, output_names, 
+                ['freeze_requantization_ranges(min_max_log_file="%s")' % log_file, 'fold_constants(ignore_errors=true)'])
+        finally:
+            shutil.rmtree(log_dir)
+    else:
+        raise Exception('Unknown quantization mode: ' + str(mode))
+        
+    write_graph_def(graph_def, model.signature, out_path)
+    
+    # Fidelity check
+    quantized = FrozenModel(out_path)
+    real = model.predict(*check_inputs)
+    pred = quantized.predict(*check_inputs)
+    model.close()
+    quantized.close()
+    
+    return {'magic_distance': float(np.mean(metrics.magic_distance(real, pred))),
+            'mean_abs_error': float(np.mean(np.abs(real - pred))),
+            'max_abs_error':  float(np.max(np.abs(real - pred))),
+            'float_size':     os.path.getsize(path),
+            'quantized_size': os.path.getsize(out_path)}
@@ -1,6 +1,5 @@
 import tensorflow as tf
 import numpy as np
-from scipy import ndimage, misc
 
 
 #Distance defined as (1 - average of probabilities data points from one set appears in other set), the higher p and amount of data points the better the estimate
@@ -18,6 +17,7 @@ def magic_distance(set_real, set_pred, p = 1000):
 inception_model = None
 def inception_score(set_real, set_pred, splits=10):
     global inception_model
+    from scipy import misc
     assert set_pred.shape[-1] == 3
     
     if inception_model is None:
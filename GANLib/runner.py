@@ -0,0 +1,71 @@
+import tensorflow as tf
+import numpy as np
+
+import os
+import multiprocessing
+
+#                   Experiment runner
+#       Description:
+#   Runs every experiment configuration (for example GAN class x distance) in a separate
+#   worker process. Each worker is pinned to its own share of CPU cores and gets its own
+#   tf.Session with intra/inter op thread pools sized to that share. Experiment results
+#   (usually 'history' dicts) are collected back into the parent process.
+
+
+def session_config(intra_op, inter_op):
+    return tf.ConfigProto(intra_op_parallelism_threads = intra_op, inter_op_parallelism_threads = inter_op)
+
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'): return sorted(os.sched_getaffinity(0))
+    return list(range(multiprocessing.cpu_count()))
+
+
+# Cores of the current worker process, set once by init_worker
+worker_cores = None
+
+def init_worker(core_sets):
+    global worker_cores
+    worker_cores = core_sets.get()
+
+    if hasattr(os, 'sched_setaffinity'): os.sched_setaffinity(0, worker_cores)
+    os.environ['OMP_NUM_THREADS'] = str(len(worker_cores))
+
+def run_worker(task):
+    experiment, config, inter_op = task
+    threads = len(worker_cores)
+
+    with tf.Graph().as_default():
+        with tf.Session(config = session_config(threads, min(inter_op, threads))) as sess:
+            return experiment(sess, config)
+
+
+def run_experiments(experiment, configs, processes = None, cores = None, inter_op = 2):
+    """Runs experiment(sess, config) for every config in a pool of worker processes.
+    # Arguments
+        experiment:
+            Module level function (it has to be picklable) that builds and trains model
+            in given session and returns result, for example 'history' of GAN.train.
+        configs:
+            List of picklable experiment configurations.
+        processes:
+            Number of worker processes. By default one per config, but not more than number of cores.
+        cores:
+            List of CPU ids to use. By default all cores available to the current process.
+        inter_op:
+            Maximum number of inter op threads of each worker session.
+    # Returns
+        A list of experiment results in the order of configs.
+    """
+    if cores is None: cores = available_cores()
+    if processes is None: processes = len(configs)
+    processes = max(1, min(processes, len(cores)))
+
+    # Each worker gets its own contiguous set of cores
+    context = multiprocessing.get_context('spawn')
+    core_sets = context.Queue()
+    for core_set in np.array_split(cores, processes):
+        core_sets.put([int(c) for c in core_set])
+
+    tasks = [(experiment, config, inter_op) for config in configs]
+    with context.Pool(processes, initializer = init_worker, initargs = (core_sets,)) as pool:
+        return pool.map(run_worker, tasks, chunksize = 1)
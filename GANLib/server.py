@@ -0,0 +1,183 @@
+import numpy as np
+
+import sys
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+#                   Micro-batching inference server
+#       Description:
+#   Coalesces concurrent prediction requests (noise, noise and labels for CGAN, domain samples
+#   for DiscoGAN, ...) into batches, that are limited by size and latency deadline, runs every
+#   batch through one predict call and scatters results back to callers. Has stdin/stdout
+#   (json lines) and localhost HTTP (json POST) front ends for testing.
+
+class BatchServer(object):
+    def __init__(self, predict, max_batch_size = 256, max_latency = 0.005):
+        """
+        # Arguments
+            predict:
+                Function of batched inputs, for example gan.predict, FrozenModel.predict or gan.encode_a.
+            max_batch_size:
+                Batch is run as soon as it has that many samples (a single larger request is run as is).
+            max_latency:
+                Maximal time in seconds the first request of the batch waits for others.
+        """
+        self.predict_func = predict
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        # Batches are run one by one in a separate thread, so the event loop keeps collecting the next one
+        self.executor = ThreadPoolExecutor(max_workers = 1)
+        self.queue = None
+        self.task = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.ensure_future(self.batch_loop())
+
+    def stop(self):
+        if self.task is not None: self.task.cancel()
+        self.task = None
+        self.queue = None
+
+    async def predict(self, *inputs):
+        if self.task is None: self.start()
+
+        inputs = [np.asarray(x) for x in inputs]
+        if len(inputs) == 0: raise ValueError('At least one input is required')
+        if any(x.ndim == 0 for x in inputs): raise ValueError('Inputs should be batched, got scalar input')
+        if len(set(len(x) for x in inputs)) > 1: raise ValueError('Inputs have different batch sizes: ' + str([len(x) for x in inputs]))
+
+        future = asyncio.get_event_loop().create_future()
+        await self.queue.put((inputs, future))
+        return await future
+
+    async def collect(self):
+        loop = asyncio.get_event_loop()
+
+        requests = [await self.queue.get()]
+        size = len(requests[0][0][0])
+        deadline = loop.time() + self.max_latency
+
+        while size < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0: break
+            try:
+                request = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            requests.append(request)
+            size += len(request[0][0])
+        return requests
+
+    async def run_batch(self, requests):
+        loop = asyncio.get_event_loop()
+        try:
+            inputs = [np.concatenate(arrays) for arrays in zip(*[inputs for inputs, _ in requests])]
+        except ValueError:
+            # Requests of different sample shapes or number of inputs can't share a batch,
+            # so each is run on its own and only incompatible ones fail
+            if len(requests) == 1: raise
+            for request in requests: await self.run_request(request)
+            return
+
+        outputs = await loop.run_in_executor(self.executor, self.predict_func, *inputs)
+
+        pos = 0
+        for inputs, future in requests:
+            n = len(inputs[0])
+            if not future.done(): future.set_result(outputs[pos:pos + n])
+            pos += n
+
+    async def run_request(self, request):
+        try:
+            await self.run_batch([request])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not request[1].done(): request[1].set_exception(e)
+
+    async def batch_loop(self):
+        while True:
+            requests = await self.collect()
+            try:
+                await self.run_batch(requests)
+            except asyncio.CancelledError:
+                for _, future in requests: future.cancel()
+                raise
+            except Exception as e:
+                # Loop keeps serving, failed batch is reported to its callers only
+                for _, future in requests:
+                    if not future.done(): future.set_exception(e)
+
+
+# ---------------
+#  Front ends
+# ---------------
+
+# Request is json object {"inputs": [input, ...]} with batched inputs of predict,
+# response is {"outputs": output}, optional "id" of request is returned with response
+async def answer_json(server, line):
+    request = {}
+    try:
+        request = json.loads(line)
+        outputs = await server.predict(*request['inputs'])
+        response = {'outputs': outputs.tolist()}
+    except Exception as e:
+        response = {'error': str(e)}
+
+    if isinstance(request, dict) and 'id' in request: response['id'] = request['id']
+    return response
+
+async def stdio_loop(server):
+    loop = asyncio.get_event_loop()
+    tasks = []
+
+    async def answer(line):
+        response = await answer_json(server, line)
+        sys.stdout.write(json.dumps(response) + '\n')
+        sys.stdout.flush()
+
+    # Every line is answered as soon as it is ready, so concurrent requests share batches
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line: break
+        if line.strip(): tasks.append(asyncio.ensure_future(answer(line)))
+
+    await asyncio.gather(*tasks)
+    server.stop()
+
+def serve_stdio(server):
+    asyncio.get_event_loop().run_until_complete(stdio_loop(server))
+
+async def handle_http(server, reader, writer):
+    status = '200 OK'
+    try:
+        await reader.readline() # request line, every request is treated as POST of json
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''): break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+        response = await answer_json(server, body.decode('utf-8'))
+        if 'error' in response: status = '400 Bad Request'
+    except Exception as e:
+        status, response = '400 Bad Request', {'error': str(e)}
+
+    data = json.dumps(response).encode('utf-8')
+    writer.write(('HTTP/1.1 %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: close\r\n\r\n' % (status, len(data))).encode('latin-1') + data)
+    await writer.drain()
+    writer.close()
+
+def serve_http(server, host = '127.0.0.1', port = 8080):
+    loop = asyncio.get_event_loop()
+    http = loop.run_until_complete(asyncio.start_server(lambda reader, writer: handle_http(server, reader, writer), host, port))
+    try:
+        loop.run_forever()
+    finally:
+        http.close()
+        server.stop()
@@ -0,0 +1,119 @@
+import tensorflow as tf
+
+import time
+
+#                   Hyperparameter sweep
+#       Description:
+#   Trains several GAN variants at once in one graph. Every GAN is built in its own
+#   variable scope, batches are sampled in graph from one shared device-resident copy
+#   of dataset and all GANs are advanced together with grouped session runs.
+#   If every GAN uses simultaneous schedule with n_critic = 1, one step is one session run.
+
+class Sweep(object):
+    def __init__(self, sess, gans, names = None):
+        # Batches are fed from graph, so every GAN should take its inputs through GAN.placeholder
+        for gan in gans:
+            if not gan.in_graph_inputs: raise Exception('%s can not be trained in Sweep, its inputs could not be fed from graph' % type(gan).__name__)
+
+        self.sess = sess
+        self.gans = gans
+
+        if names is None: names = ['sweep_%d'%i for i in range(len(gans))]
+        self.names = names
+
+    def build_models(self, data_set, batch_size):
+        # Dataset is loaded into variable once, through placeholder to not store it in graph definition
+        data_init = tf.placeholder(tf.as_dtype(data_set.dtype), shape = data_set.shape)
+        self.data = tf.Variable(data_init, trainable = False, collections = [])
+        self.sess.run(self.data.initializer, feed_dict = {data_init: data_set})
+
+        for name, gan in zip(self.names, self.gans):
+            idx = tf.random_uniform([batch_size], 0, data_set.shape[0], dtype = tf.int32)
+            gan.input_tensors['disc_input'] = tf.gather(self.data, idx)
+            gan.input_tensors['genr_input'] = tf.random_uniform([batch_size, gan.latent_dim], minval = -1, maxval = 1)
+
+            with tf.variable_scope(name):
+                gan.build_models()
+
+        # Critic only steps, then final step that updates generators (and critics in simultaneous schedule) and fetches losses
+        critic_steps = [gan.n_critic - 1 if gan.simultaneous else gan.n_critic for gan in self.gans]
+        self.train_critics = []
+        for j in range(max(critic_steps)):
+            self.train_critics.append(tf.group(*[gan.train_disc for gan, n in zip(self.gans, critic_steps) if j < n]))
+
+        final_ops = [gan.train_both if gan.simultaneous else gan.train_genr for gan in self.gans]
+        self.train_final = tf.group(*final_ops)
+
+        # Moving averages are updated within the final run, for every GAN whose update is due at that step
+        self.ema_updates = []
+        for name, gan, op in zip(self.names, self.gans, final_ops):
+            with tf.name_scope(name):
+                self.ema_updates.append(gan.build_ema_updates([op]) if gan.ema is not None else None)
+        self.losses = [[gan.disc_loss, gan.genr_loss] for gan in self.gans]
+
+        self.epoch_input = tf.placeholder(tf.int32, shape = ())
+        self.set_epoch = tf.group(*[gan.epoch.assign(self.epoch_input) for gan in self.gans])
+
+    def train_on_batch(self, epoch):
+        # Epoch counters are updated within the first run of the step
+        set_epoch = [self.set_epoch]
+        for train_critic in self.train_critics:
+            self.sess.run([train_critic] + set_epoch, feed_dict = {self.epoch_input: epoch})
+            set_epoch = []
+
+        train_final = [self.train_final] + set_epoch
+        for gan, updates in zip(self.gans, self.ema_updates):
+            due = gan.ema_due()
+            if due is not None: train_final.append(updates[due])
+
+        _, losses = self.sess.run([train_final, self.losses], feed_dict = {self.epoch_input: epoch})
+        return losses
+
+    def train(self, data_set, batch_size=32, epochs=1, verbose=True, checkpoint_range = 100, checkpoint_callback = None, validation_split = 0, collect_history = True):
+        """Trains all GANs of the sweep for a given number of epochs on the same dataset.
+        # Arguments
+            Same as in GAN.train, except that data_set should be a single numpy array.
+            checkpoint_callback:
+                Callback to apply during training on checkpoint stage, it receives the sweep object.
+        # Returns
+            A list of history objects, one per GAN.
+        """
+        max_hist_size = epochs//checkpoint_range + 1
+        histories = [{'best_metric':0, 'hist_size':0} for gan in self.gans]
+
+        for gan in self.gans:
+            gan.epoch.load(0, self.sess)
+            gan.epochs.load(epochs, self.sess)
+            gan.prepare_data(data_set, validation_split, batch_size)
+
+        self.build_models(self.gans[0].train_set, batch_size)
+
+        t = time.time()
+        for epoch in range(epochs):
+            losses = self.train_on_batch(epoch)
+
+            if epoch % checkpoint_range == 0:
+                d_t = time.time() - t
+                t = time.time()
+
+                for name, gan, history, (d_loss, g_loss) in zip(self.names, self.gans, histories, losses):
+                    if not collect_history:
+                        if verbose: print('%s %d [D loss: %f] [G loss: %f] time: %f' % (name, epoch, d_loss, g_loss, d_t))
+                        continue
+
+                    metric = gan.update_history(history, max_hist_size, d_loss, g_loss)
+                    if verbose: print ("%s %d [D loss: %f] [G loss: %f] [%s: %f] time: %f" % (name, epoch, d_loss, g_loss, 'metric', metric, d_t))
+
+                    if metric < gan.best_metric:
+                        gan.best_metric = metric
+                        history['best_metric'] = gan.best_metric
+
+                    gan.history = history
+
+                if checkpoint_callback is not None:
+                    checkpoint_callback(self)
+
+        for gan in self.gans:
+            gan.epoch.load(epochs, self.sess)
+
+        return [gan.history for gan in self.gans]
@@ -0,0 +1,112 @@
+import tensorflow as tf
+import numpy as np
+
+import os
+import json
+import time
+import socket
+import hashlib
+import multiprocessing
+
+from .runner import session_config
+
+#                   Session threading tuner
+#       Description:
+#   Benchmarks a few training steps of the user's GAN across intra/inter op thread
+#   settings, picks the fastest configuration and caches the choice per host and
+#   model signature, so the benchmark runs only once.
+
+default_cache_file = os.path.join(os.path.expanduser('~'), '.ganlib', 'session_cache.json')
+
+
+def default_candidates():
+    cores = multiprocessing.cpu_count()
+    intra_ops = sorted(set([cores, max(1, cores // 2), max(1, cores // 4)]), reverse = True)
+    return [(intra, inter) for intra in intra_ops for inter in (1, 2, 4)]
+
+def load_cache(cache_file):
+    if cache_file is None or not os.path.exists(cache_file): return {}
+    with open(cache_file) as f:
+        return json.load(f)
+
+#Cache file is replaced atomically, so concurrent runs never read half written file
+def save_cache(cache, cache_file):
+    if cache_file is None: return
+    cache_dir = os.path.dirname(cache_file)
+    if cache_dir and not os.path.isdir(cache_dir): os.makedirs(cache_dir)
+    
+    tmp_file = '%s.%d.tmp' % (cache_file, os.getpid())
+    with open(tmp_file, 'w') as f:
+        json.dump(cache, f, indent = 2)
+    os.replace(tmp_file, cache_file)
+
+def build_gan(build, sess, data_set, batch_size, epochs):
+    gan = build(sess)
+    gan.epoch.load(0, sess)
+    gan.epochs.load(epochs, sess)
+    gan.prepare_data(data_set, 0, batch_size)
+    gan.build_models()
+    return gan
+
+# Model signature is hash of its training graph, so it changes with model structure, shapes and batch size.
+# Serialization is deterministic (sorted map fields such as node attributes), so the same graph always gives the same hash
+def model_signature(build, data_set, batch_size):
+    with tf.Graph().as_default() as graph:
+        with tf.Session() as sess:
+            build_gan(build, sess, data_set, batch_size, 1)
+        graph_def = graph.as_graph_def().SerializeToString(deterministic = True)
+    return hashlib.sha1(graph_def).hexdigest()
+
+def benchmark(build, data_set, batch_size, config, steps, warmup):
+    with tf.Graph().as_default():
+        with tf.Session(config = config) as sess:
+            gan = build_gan(build, sess, data_set, batch_size, steps + warmup)
+
+            for i in range(warmup):
+                gan.train_on_batch(batch_size)
+
+            t = time.time()
+            for i in range(steps):
+                gan.train_on_batch(batch_size)
+            return (time.time() - t) / steps
+
+
+def tuned_session(build, data_set, batch_size = 32, steps = 10, warmup = 3, candidates = None, cache_file = default_cache_file, verbose = True):
+    """Creates tf.Session with the fastest thread configuration for given model.
+    # Arguments
+        build:
+            Function build(sess) that creates GAN in given session and defines its models,
+            but does not train it.
+        data_set:
+            Numpy array of training data (or a part of it) used for benchmark.
+        batch_size:
+            Batch size used for training.
+        steps, warmup:
+            Number of timed and untimed training steps for each configuration.
+        candidates:
+            List of (intra_op, inter_op) thread numbers to test.
+        cache_file:
+            Json file where choices are stored per host and model signature. None disables cache.
+    # Returns
+        A tf.Session for the default graph.
+    """
+    if candidates is None: candidates = default_candidates()
+
+    key = '%s/%d/%s' % (socket.gethostname(), multiprocessing.cpu_count(), model_signature(build, data_set, batch_size))
+    cache = load_cache(cache_file)
+
+    if key not in cache:
+        times = []
+        for intra_op, inter_op in candidates:
+            step_time = benchmark(build, data_set, batch_size, session_config(intra_op, inter_op), steps, warmup)
+            if verbose: print('intra_op: %d inter_op: %d step time: %f' % (intra_op, inter_op, step_time))
+            times.append(step_time)
+
+        # Cache is reloaded, so entries written by other runs during the benchmark are kept
+        cache = load_cache(cache_file)
+        cache[key] = list(candidates[int(np.argmin(times))])
+        save_cache(cache, cache_file)
+
+    intra_op, inter_op = cache[key]
+    if verbose: print('Session threading: intra_op %d, inter_op %d' % (intra_op, inter_op))
+    return tf.Session(config = session_config(intra_op, inter_op))
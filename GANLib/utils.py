@@ -1,7 +1,8 @@
 import numpy as np
 import tensorflow as tf
 
-import matplotlib.pyplot as plt
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 
 # ---------------
@@ -33,6 +34,7 @@ def MiniBatchStddev(x, group_size=4): #again position of channels matter!
 # ---------------
 
 def save_hist_image(hist, file, graphs = (['metric'], ['D loss', 'G loss']), scales = ('log', 'linear')):
+    import matplotlib.pyplot as plt # imported on first use, so headless workers do not pay for it
     hist_size = hist['hist_size']
 
     plt.figure(figsize=(14,7))
@@ -60,4 +62,80 @@ def save_hist_image(hist, file, graphs = (['metric'], ['D loss', 'G loss']), sca
     plt.tight_layout()
     
     plt.savefig(file, format='png')
-    plt.close()    
\ No newline at end of file
+    plt.close()
+
+
+# ---------------
+#  Streaming
+# ---------------
+
+def chunk_ranges(n, batch_size):
+    for start in range(0, n, batch_size):
+        yield start, min(start + batch_size, n)
+        
+#Splits array-like data (np.ndarray, np.memmap) into slices, or groups samples of any other iterable into stacked batches
+def iterate_chunks(data, batch_size):
+    if hasattr(data, 'shape'):
+        for start, stop in chunk_ranges(data.shape[0], batch_size):
+            yield data[start:stop]
+        return
+        
+    batch = []
+    for sample in data:
+        batch.append(sample)
+        if len(batch) == batch_size:
+            yield np.stack(batch)
+            batch = []
+    if len(batch) > 0: yield np.stack(batch)
+        
+#Applies func to items in a background thread, so the next result is computed while the current one is consumed
+def prefetch(func, items):
+    with ThreadPoolExecutor(max_workers = 1) as executor:
+        future = None
+        for item in items:
+            next_future = executor.submit(func, item)
+            if future is not None: yield future.result()
+            future = next_future
+        if future is not None: yield future.result()
+
+#Writes consecutive chunks of samples into 'out': preallocated array or np.memmap, path to .npy file (memory mapped, n required),
+#path to directory of .npy shards or None (new in-memory array, n required)
+def write_chunks(chunks, out = None, n = None):
+    array = out if isinstance(out, np.ndarray) else None
+    if array is None and n is None and (out is None or out.endswith('.npy')):
+        raise Exception('Number of samples is unknown (data without length?), it is required to allocate output array or .npy file. Use directory of shards or preallocated array as output')
+    pos = 0
+    for i, chunk in enumerate(chunks):
+        if array is None:
+            if out is None: 
+                array = np.empty((n,) + chunk.shape[1:], dtype = chunk.dtype)
+            elif out.endswith('.npy'): 
+                array = np.lib.format.open_memmap(out, mode = 'w+', dtype = chunk.dtype, shape = (n,) + chunk.shape[1:])
+            else:
+                if not os.path.isdir(out): os.makedirs(out)
+                np.save(os.path.join(out, 'shard_%05d.npy'%i), chunk)
+                continue
+                
+        array[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+        
+    if isinstance(array, np.memmap): array.flush()
+    return out if array is None else array
+        
+        
+# ---------------
+#  Checkpoints
+# ---------------
+
+#Writes variables values (dict by names) and picklable training state into npz file, 
+#file is replaced atomically, so interrupted write never corrupts previous checkpoint
+def save_checkpoint(file, values, state):
+    tmp_file = file + '.tmp.npz'
+    np.savez(tmp_file, state = np.array([state], dtype = object), **{'var:' + k: v for k, v in values.items()})
+    os.replace(tmp_file, file)
+
+def load_checkpoint(file):
+    with np.load(file, allow_pickle = True) as data:
+        values = {k[len('var:'):]: data[k] for k in data.files if k.startswith('var:')}
+        state = data['state'][0]
+    return values, state
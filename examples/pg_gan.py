@@ -1,4 +1,5 @@
-from GANLib import GAN, utils, distances
+from GANLib import ProGAN, utils, distances
+from GANLib.data import Pyramid, augmentation
 
 import tensorflow as tf
 import matplotlib.pyplot as plt
@@ -20,21 +21,6 @@ from skimage.measure import block_reduce
 # Auxiliary functions
 #-------------------------------  
 
-def augment(data):
-    off_x_p = data.copy()
-    off_x_p[:,1:,:,:] = off_x_p[:,:-1,:,:]
-    off_x_m = data.copy()
-    off_x_p[:,:-1,:,:] = off_x_p[:,1:,:,:]
-    data = np.concatenate((data,off_x_p,off_x_m), axis = 0)
-    
-    off_y_p = data.copy()
-    off_y_p[:,:,1:,:] = off_y_p[:,:,:-1,:]
-    off_y_m = data.copy()
-    off_y_m[:,:,:-1,:] = off_y_m[:,:,1:,:]
-    data = np.concatenate((data,off_y_p,off_y_m), axis = 0)
-    
-    return data
-    
 def upscale2d(x, factor=2):
     assert isinstance(factor, int) and factor >= 1
     if factor == 1: return x
@@ -66,7 +52,6 @@ noise_dim = 64
 channels = 3
 
 weights = {}
-sheets = 0
 
 
 def new_sheet(filters, kernel_size, padding, name, pix_norm = True):
@@ -77,14 +62,7 @@ def new_sheet(filters, kernel_size, padding, name, pix_norm = True):
         return layer
     return func
     
-def transition_alpha(gan):
-    epoch = tf.cast(gan.epoch, tf.float32)
-    epochs = tf.cast(gan.epochs, tf.float32)
-    a = epoch / (epochs/ 2)
-    b = 1
-    return tf.minimum(a, b) 
-   
-def generator(input, gan):
+def generator(input, sheets, alpha):
     previous_step = None
     next_step = None
 
@@ -110,13 +88,13 @@ def generator(input, gan):
     #smooth fading
     if previous_step is not None: 
         previous_step = tf.layers.conv2d(previous_step, channels, (1,1), name = 'to_rgb_'+str(sheets - 1)) 
-        layer = previous_step + (next_step - previous_step) * transition_alpha(gan)
+        layer = previous_step + (next_step - previous_step) * alpha
     else:
         layer = next_step
       
     return layer
     
-def discriminator(input, gan):
+def discriminator(input, sheets, alpha):
     previous_step = None
     next_step = None
     
@@ -139,7 +117,7 @@ def discriminator(input, gan):
             previous_step = tf.layers.conv2d(previous_step, filters_list[i - 1], (1,1), name = 'from_rgb_'+str(sheets - 1), kernel_initializer = initialization) #from RGB
             previous_step = tf.nn.leaky_relu(previous_step, alpha=0.2)
         
-            layer = previous_step + (next_step - previous_step) * transition_alpha(gan)
+            layer = previous_step + (next_step - previous_step) * alpha
                 
     
     layer = utils.MiniBatchStddev(layer, group_size=4)
@@ -187,40 +165,33 @@ labels = np.concatenate((labelsa,labelsb), axis = 0)
 indx = np.where(labels == 8)[0] # we choose only one specific domain from the dataset
 dataset = dataset[indx]
 
-# Configure input
-dataset = (dataset.astype(np.float32) - 127.5) / 127.5
+# Configure input, dataset stays uint8 and is scaled to [-1, 1] batch by batch
 if len(dataset.shape)<4:
     dataset = np.expand_dims(dataset, axis=3)
     
 
-# 6000 examples is not enough, so we augment dataset by shifting it along axis by 1 pixel 
-dataset = augment(dataset)
- 
 epochs_list = [4000, 8000, 16000, 32000]
 batch_size_list = [16, 16, 16, 16]  
 image_size_list = [4, 8, 16, 32] 
 filters_list = [48, 32, 24, 16]
 
-optimizer = tf.train.AdamOptimizer(0.001, 0., 0.99, epsilon = 1e-08) #Hyperparameters for optimizer from paper
+optimizer = lambda: tf.train.AdamOptimizer(0.001, 0., 0.99, epsilon = 1e-08) #Hyperparameters for optimizer from paper, new optimizer is created for every stage
 with tf.Session() as sess:
     t = time.time()
-    dataset_t = tf.Variable(np.zeros_like(dataset), dtype = tf.float32)
-    for i in range(len(epochs_list)):    
-        epochs = epochs_list[i]
-        batch_size = batch_size_list[i]
-        
-        data_set = sess.run(tf.image.resize_bilinear(dataset_t, (image_size_list[i], image_size_list[i])), feed_dict = {dataset_t: dataset})
-        print(data_set.shape)
-        
-        # Build and train GAN
-        gan = GAN(sess, data_set.shape[1:], noise_dim, optimizer = optimizer, distance = distances.wasserstein_gp)
-        gan.generator = lambda x: generator(x, gan) #define generator model
-        gan.discriminator = lambda x: discriminator(x, gan) #define discriminator model
+    
+    # All resolution levels are computed once and cached on disk
+    data_sets = Pyramid(dataset, image_size_list, mode = 'bilinear', path = 'pg_gan_pyramid')
+    
+    # Build and train GAN, every stage adds new layers to generator and discriminator
+    input_shapes = [(s, s, channels) for s in image_size_list]
+    gan = ProGAN(sess, input_shapes, noise_dim, optimizer = optimizer, distance = distances.wasserstein_gp,
+                 augmentation = augmentation(shift = 1)) # 6000 examples is not enough, so every batch is randomly shifted by 1 pixel
+    gan.stage_generator = generator #define generator model
+    gan.stage_discriminator = discriminator #define discriminator model
+    
+    def callback():
+        sample_images(gan, 'pg_gan.png')
         
-        def callback():
-            sample_images(gan, 'pg_gan.png')
-            
-        gan.train(data_set, epochs = epochs, batch_size = batch_size, checkpoint_callback = callback, collect_history = False)  
-        sheets += 1
+    gan.train(data_sets, epochs_list, batch_size_list, checkpoint_callback = callback, collect_history = False)  
         
     print('Training complete! Total traning time: %f s'%(time.time() - t))   
@@ -0,0 +1,24 @@
+from GANLib import CGAN
+
+import numpy as np
+
+import tensorflow as tf
+
+# Imbalanced labels: 90%, 9% and 1% of samples
+counts = [90, 9, 1]
+labels = np.repeat(np.arange(len(counts)), counts)
+data = np.zeros((len(labels), 1), dtype = np.float32)
+
+batch_size = 32
+n_batches = 10000
+
+with tf.Session() as sess:
+    gan = CGAN(sess, [data.shape[1:], (len(counts),)], sparse_labels = True, sampling = 'stratified')
+    gan.prepare_data([data, labels], 0, batch_size)
+
+    sampled = np.concatenate([labels[gan.sample_indices(batch_size)] for i in range(n_batches)])
+    freq = np.bincount(sampled, minlength = len(counts)) / len(sampled)
+    expected = np.array(counts) / np.sum(counts)
+
+    print('Class frequencies:', freq, 'expected:', expected)
+    assert np.allclose(freq, expected, atol = 0.005), 'Stratified sampling is biased'
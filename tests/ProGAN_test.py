@@ -0,0 +1,130 @@
+from GANLib import ProGAN, distances
+
+import tensorflow as tf
+import matplotlib.pyplot as plt
+import numpy as np
+import os
+
+def upscale2d(x, factor=2):
+    assert isinstance(factor, int) and factor >= 1
+    if factor == 1: return x
+    with tf.variable_scope('Upscale2D'):
+        s = x.shape
+        x = tf.reshape(x, [-1, s[1], 1, s[2], 1, s[3]])
+        x = tf.tile(x, [1, 1, factor, 1, factor, 1])
+        x = tf.reshape(x, [-1, s[1] * factor, s[2] * factor, s[3]])
+        return x
+
+# G(z), every stage doubles resolution: 7x7 -> 14x14 -> 28x28
+def generator(x, stage, alpha):
+    layer = tf.layers.dense(x, 784, name = 'genr_head')
+    layer = tf.nn.leaky_relu(layer,alpha=0.2)
+    layer = tf.reshape(layer,[-1,7,7,16])
+
+    previous_step = None
+    for i in range(stage):
+        layer = upscale2d(layer)
+        if i == stage - 1: previous_step = layer
+        layer = tf.layers.conv2d(layer, 16, (3,3), padding='same', name = 'genr_layer_'+str(i))
+        layer = tf.nn.leaky_relu(layer, alpha=0.2)
+
+    img = tf.layers.conv2d(layer, 1, (1,1), padding='same', name = 'to_img_'+str(stage))
+
+    # smooth fading of the new layer
+    if previous_step is not None:
+        previous_step = tf.layers.conv2d(previous_step, 1, (1,1), padding='same', name = 'to_img_'+str(stage - 1))
+        img = previous_step + (img - previous_step) * alpha
+    return img
+
+# D(x)
+def discriminator(x, stage, alpha, outputs):
+    layer = tf.layers.conv2d(x, 16, (1,1), padding='same', name = 'from_img_'+str(stage))
+    layer = tf.nn.leaky_relu(layer, alpha=0.2)
+
+    for i in range(stage, 0, -1):
+        layer = tf.layers.conv2d(layer, 16, (3,3), padding='same', name = 'disc_layer_'+str(i))
+        layer = tf.nn.leaky_relu(layer, alpha=0.2)
+        layer = tf.layers.average_pooling2d(layer, 2, 2)
+
+        # smooth fading of the new layer
+        if i == stage:
+            previous_step = tf.layers.average_pooling2d(x, 2, 2)
+            previous_step = tf.layers.conv2d(previous_step, 16, (1,1), padding='same', name = 'from_img_'+str(stage - 1))
+            previous_step = tf.nn.leaky_relu(previous_step, alpha=0.2)
+            layer = previous_step + (layer - previous_step) * alpha
+
+    layer = tf.layers.flatten(layer)
+    layer = tf.layers.dense(layer,128, name = 'disc_head')
+    layer = tf.nn.leaky_relu(layer, alpha=0.2)
+
+    validity = tf.layers.dense(layer, outputs, name = 'disc_out')
+
+    return validity
+
+mnist = tf.keras.datasets.mnist
+tests = { 'dataset':  (mnist, mnist, mnist, mnist, mnist),
+          'img_name': ('mnist_minmax', 'mnist_cross_entropy', 'mnist_wasserstein', 'mnist_iwasserstein_gp', 'mnist_cramer', ),
+          'distance': (distances.minmax, distances.cross_entropy, distances.wasserstein, distances.wasserstein_gp, distances.cramer, ),
+          'disc_out': (1, 1, 1, 1, 128, )
+        }
+
+noise_dim = 100
+image_size_list = [7, 14, 28]
+epochs_list = [1000, 2000, 2000]
+batch_size_list = [64, 64, 64]
+
+def sample_images(gen, file):
+    r, c = 5, 5
+
+    noise = np.random.uniform(-1, 1, (r * c, noise_dim))
+
+    gen_imgs = gen.predict(noise)
+
+    # Rescale images 0 - 1
+    gen_imgs = 0.5 * gen_imgs + 0.5
+    gen_imgs = np.clip(gen_imgs,0,1)
+
+    fig, axs = plt.subplots(r, c)
+    cnt = 0
+    for i in range(r):
+        for j in range(c):
+            if gen_imgs.shape[-1] == 1:
+                axs[i,j].imshow(gen_imgs[cnt,:,:,0], cmap='gray')
+            else:
+                axs[i,j].imshow(gen_imgs[cnt,:,:])
+            axs[i,j].axis('off')
+            cnt += 1
+    fig.savefig(file) #% epoch
+    plt.close()
+
+
+for i in range(len(tests['dataset'])):
+    # Load the dataset
+    (X_train, _), (_, _) = tests['dataset'][i].load_data()
+
+    # Configure input
+    X_train = (X_train.astype(np.float32) - 127.5) / 127.5
+
+    if len(X_train.shape)<4:
+        X_train = np.expand_dims(X_train, axis=3)
+
+    # Box downsampling for every stage
+    data_sets = [X_train.reshape((-1, s, 28 // s, s, 28 // s, 1)).mean(axis = (2, 4)) for s in image_size_list]
+
+    if not os.path.isdir('images/ProGAN'): os.makedirs('images/ProGAN')
+
+    # Every configuration is built in its own graph, so models with different outputs don't share variables
+    with tf.Graph().as_default(), tf.Session() as sess:
+        #Run GAN for 5000 iterations over 3 stages
+        gan = ProGAN(sess, [d.shape[1:] for d in data_sets], noise_dim, distance = tests['distance'][i], n_critic = 3)
+
+        gan.stage_generator = generator
+        gan.stage_discriminator = lambda x, stage, alpha: discriminator(x, stage, alpha, tests['disc_out'][i])
+
+        def callback():
+            path = 'images/ProGAN/tf_'+tests['img_name'][i]
+            sample_images(gan, path+'.png')
+            gan.save_history_to_image(path+'_history.png')
+
+        gan.train(data_sets, epochs_list, batch_size_list, checkpoint_callback = callback)
+